@@ -1,9 +1,72 @@
+import argparse
 import numpy as np
 import random
+import heapq
+import multiprocessing
 import pygame
+import struct
 import time
+from array import array
+from collections import OrderedDict
+from multiprocessing import shared_memory
+
+from frontier_bfs import FrontierBFS
+from snake_core import BODY, DistanceField
 
 rand = random.Random()
+zobrist_keys = {}  # (height, width): Zobrist keys of that board size, see zobrist()
+# game state, score, head, vel, food, length of the snake, hash; the header of SnakeGame.snapshot()
+SNAPSHOT = struct.Struct('<BIhhbbhhHQ')
+MOVES = [[-1, 0], [1, 0], [0, -1], [0, 1]]
+
+
+def zobrist(height, width):
+    # random 64 bit keys for every cell as part of the body, as the head and as the food, from their own generator
+    # so the games don't depend on them. A board hashes to the xor of the keys of what is on it
+    if (height, width) not in zobrist_keys:
+        keys = random.Random(0x5A0B)
+        zobrist_keys[height, width] = [[keys.getrandbits(64) for _ in range(height * width)] for _ in range(3)]
+    return zobrist_keys[height, width]
+
+
+def astar_cells(root, food, blocked, neighbor_cells, width):
+    # A* ordered by f = g + manhattan distance to the food, on cell ids (i * width + j) with plain ints, a set of
+    # blocked cells and a heap, so nothing in the loop touches NumPy or copies lists. neighbor_cells[cell] lists the
+    # cells next to cell. Returns the parent and g of the reached cells, the number of cells expanded, whether the
+    # food was reached and the last cell explored other than root (None if there is none)
+    food_i, food_j = divmod(food, width)
+    parents = {}
+    g = {root: 0}
+    not_explored = [(0, 0, root)]  # open list as a heap of (f, -g, cell), deeper cells first on equal f
+    explored = set()  # closed list
+    last_explored = None
+    food_found = False
+    while not_explored:
+        f, node_g, node = heapq.heappop(not_explored)
+        node_g = -node_g
+        if node in explored:
+            continue
+        explored.add(node)
+        if node == food:
+            food_found = True
+            break
+        if node != root:
+            last_explored = node
+        child_g = node_g + 1
+        for cell in neighbor_cells[node]:
+            if cell in blocked or cell in explored or child_g >= g.get(cell, child_g + 1):
+                continue
+            g[cell] = child_g
+            parents[cell] = node
+            h = abs(cell // width - food_i) + abs(cell % width - food_j)
+            heapq.heappush(not_explored, (child_g + h, -child_g, cell))
+    return parents, g, len(explored) - 1, food_found, last_explored
+
+
+def first_step(parents, root, loc):  # cell next to root on the path astar_cells() found from root to loc
+    while parents[loc] != root:
+        loc = parents[loc]
+    return loc
 
 
 class SnakeGame():
@@ -24,6 +87,16 @@ class SnakeGame():
         self.food = self.rand_food()
         self.board[self.food[0], self.food[1]] = -1
 
+        # Zobrist hash of the body cells, head and food, kept up to date by update_state
+        self.body_keys, self.head_keys, self.food_keys = zobrist(self.height, self.width)
+        self.hash = self.head_keys[self.cell(self.head)] ^ self.food_keys[self.cell(self.food)]
+        for s in self.snake:
+            self.hash ^= self.body_keys[self.cell(s)]
+        self.undo_log = []  # what apply_move() changed, newest last
+
+    def cell(self, loc):
+        return loc[0] * self.width + loc[1]
+
     def __str__(self):
         b_str = " " + "_" * self.width + f"  Score: {self.score}\n"
         for i in range(self.height):
@@ -67,6 +140,8 @@ class SnakeGame():
             self.head = self.snake[0].copy()  # did not enter valid move
             self.game_state = False
         elif self.head not in self.snake:  # snake moved
+            head = self.cell(self.head)
+            self.hash ^= self.head_keys[self.cell(self.snake[0])] ^ self.head_keys[head] ^ self.body_keys[head]
             if self.head == self.food:  # ate food, grow snake, gen food
                 self.score += 1
                 self.snake.insert(0, self.head.copy())
@@ -74,15 +149,338 @@ class SnakeGame():
                 self.board[self.head[0], self.head[1]] = 2
                 self.food = self.rand_food()
                 self.board[self.food[0], self.food[1]] = -1
+                self.hash ^= self.food_keys[head] ^ self.food_keys[self.cell(self.food)]
             else:  # move snake
                 self.snake.insert(0, self.head.copy())
                 self.board[self.snake[1][0], self.snake[1][1]] = 1
                 self.board[self.head[0], self.head[1]] = 2
                 rem = self.snake.pop()
                 self.board[rem[0], rem[1]] = 0
+                self.hash ^= self.body_keys[self.cell(rem)]
         else:
             self.head = self.snake[0].copy()  # did not enter valid move
 
+    def snapshot(self):
+        # the game as bytes of a fixed size for lookahead: the header and the body cells head first as i * width + j,
+        # padded to one per board cell. The board is not copied, restore() fills it in from the cells
+        cells = array('H', [i * self.width + j for i, j in self.snake])
+        return b''.join((SNAPSHOT.pack(self.game_state, self.score, self.head[0], self.head[1], self.vel[0],
+                                       self.vel[1], self.food[0], self.food[1], len(cells), self.hash),
+                         cells.tobytes(), bytes(2 * (self.height * self.width - len(cells)))))
+
+    def restore(self, data):
+        (game_state, self.score, head_i, head_j, vel_i, vel_j, food_i, food_j, length,
+         self.hash) = SNAPSHOT.unpack_from(data)
+        cells = np.frombuffer(data, dtype=np.uint16, count=length, offset=SNAPSHOT.size)
+        self.game_state = bool(game_state)
+        self.head = [head_i, head_j]
+        self.vel = [vel_i, vel_j]
+        self.food = [food_i, food_j]
+        self.snake = [list(divmod(cell, self.width)) for cell in cells.tolist()]
+        board = self.board.reshape(-1)
+        board.fill(0)
+        board[self.cell(self.food)] = -1  # under the body after apply_move() ate it
+        board[cells] = 1
+        board[cells[0]] = 2
+        self.undo_log.clear()
+
+    def apply_move(self, vel):
+        # update_vel() and update_state() for lookahead, taken back by undo_move(), returns game_state. Eating grows
+        # the snake but places no new food since that would draw from rand and change the game, the food stays
+        # under the body until the move is undone
+        snake = self.snake
+        head = snake[0]
+        i, j = head[0] + vel[0], head[1] + vel[1]
+        if [i, j] == snake[1]:  # keep going the old way
+            vel = self.vel
+            i, j = head[0] + vel[0], head[1] + vel[1]
+        before = (self.vel, self.game_state, self.score, self.hash)
+        self.vel = vel
+        board = self.board
+        if not self.game_state or not (0 <= i < self.height and 0 <= j < self.width) or board[i, j] > 0:
+            self.undo_log.append(before + (None, False))
+            self.game_state = False  # the tail counts as body, like in update_state()
+            return False
+        new = i * self.width + j
+        self.hash ^= self.head_keys[self.cell(head)] ^ self.head_keys[new] ^ self.body_keys[new]
+        board[head[0], head[1]] = 1
+        tail = None
+        if board[i, j] < 0:
+            self.score += 1
+        else:
+            tail = snake.pop()
+            board[tail[0], tail[1]] = 0
+            self.hash ^= self.body_keys[self.cell(tail)]
+        board[i, j] = 2
+        snake.insert(0, [i, j])
+        self.head = [i, j]
+        self.undo_log.append(before + (tail, True))
+        return True
+
+    def undo_move(self):
+        self.vel, self.game_state, self.score, self.hash, tail, moved = self.undo_log.pop()
+        if moved:
+            snake = self.snake
+            i, j = snake.pop(0)
+            self.board[i, j] = 0 if tail else -1
+            if tail:
+                snake.append(tail)
+                self.board[tail[0], tail[1]] = 1
+            self.board[snake[0][0], snake[0][1]] = 2
+            self.head = snake[0].copy()
+
+
+class RingBuffer():
+    # fixed-size buffer of the last samples, a new sample overwrites the oldest one
+
+    def __init__(self, size=256):
+        self.samples = array("d", bytes(8 * size))
+        self.count = 0
+
+    def append(self, value):
+        self.samples[self.count % len(self.samples)] = value
+        self.count += 1
+
+    def values(self):  # samples in the buffer, not in time order once it has wrapped around
+        return self.samples[:min(self.count, len(self.samples))]
+
+    def percentile(self, p):
+        values = sorted(self.values())
+        if len(values) == 0:
+            return 0.0
+        return values[min(len(values) - 1, int(p * len(values)))]
+
+    def mean(self):
+        values = self.values()
+        return sum(values) / len(values) if len(values) else 0.0
+
+    def rate(self):  # samples per second, for a buffer of time stamps
+        n = min(self.count, len(self.samples))
+        if n < 2:
+            return 0.0
+        newest = self.samples[(self.count - 1) % len(self.samples)]
+        oldest = self.samples[(self.count - n) % len(self.samples)]
+        return (n - 1) / (newest - oldest) if newest > oldest else 0.0
+
+
+class TranspositionTable():
+    # planner results by Zobrist hash of the board, holds at most size entries and drops the least recently used
+
+    def __init__(self, size=1 << 16):
+        self.entries = OrderedDict()
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+
+FREE_MASK_MULTIPLIER = np.uint32(1 << 24 | 1 << 17 | 1 << 10 | 1 << 3)  # moves byte i of a uint32 to bit 24 + i
+# RANDOM_FREE_MOVE[mask * 12 + k] is the (k mod number of free moves)-th free move of a 4 bit mask of free moves, a
+# uniform k in [0, 12) picks uniformly among them; -1 when no move is free
+RANDOM_FREE_MOVE = np.array([[move for move in range(4) if mask >> move & 1][k % bin(mask).count("1")] if mask else -1
+                             for mask in range(16) for k in range(12)])
+PLAYOUT_STEPS_PER_MS = 6000  # default rate of RolloutPlanner, a little under what calibrate() gives here
+
+
+class RolloutPlanner():
+    # picks the move that survives longest in random playouts, for when there is no path to the food
+    # the playouts run in lockstep on NumPy arrays, one row per playout, and never copy the game: a cell blocks a
+    # playout until its tail has moved past it, so every cell holds the number of tail moves after which it is free.
+    # Cells of the real body get that number once per call. A playout that entered a cell at step s has made
+    # s + len(snake) moves, eating or not, by the time its tail leaves that cell again, so the cells the playouts
+    # entered are kept in one (playouts x cells) array as that number, allocated once and cleared after every call.
+    # The numbers are int8 and capped at 127, which is more tail moves than a playout makes. Cells are numbered on
+    # the board with a border of blocked cells around it, so a move never leaves the arrays
+    # The budget is turned into a playout depth with a rate of steps_per_ms rather than read off the clock, so a
+    # seeded game plays the same moves as long as the rate is the same. The clock still stops playouts at the end
+    # of the budget, which counts as a cutoff: a call that was cut off may not repeat, so on a machine slower than
+    # the rate, lower it or calibrate() it
+
+    def __init__(self, height, width, playouts=512, depth=40, seed=0, steps_per_ms=PLAYOUT_STEPS_PER_MS):
+        self.width = width + 2
+        self.cells = (height + 2) * self.width
+        self.offsets = np.array([-self.width, self.width, -1, 1])  # get_safe_moves order: up, down, left, right
+        self.moves = [[-1, 0], [1, 0], [0, -1], [0, 1]]
+        self.playouts = playouts  # per first move
+        self.depth = depth
+        self.rng = np.random.default_rng(seed)
+        border = np.full((height + 2, self.width), 127, dtype=np.int8)
+        border[1:-1, 1:-1] = 0
+        self.border = border.reshape(-1)
+        self.entered = np.zeros(0, dtype=np.int8)
+        self.steps_per_ms = steps_per_ms
+        self.calls = self.rollouts = self.steps = self.cutoffs = 0
+        self.time = self.longest = 0.0
+
+    def calibrate(self, budget_ms=2.0, seconds=0.5, margin=0.75):
+        # sets steps_per_ms so that a call with budget_ms takes margin times that long, measured on a short snake in
+        # the middle of the board whose playouts live long like the ones of a real fallback, and returns it
+        height, width = self.cells // self.width - 2, self.width - 2
+        snake = [(height // 2 + i, width // 2) for i in range(3)]
+        rng, self.rng = self.rng, np.random.default_rng(0)  # the seeded playouts of the game stay untouched
+        totals = self.calls, self.rollouts, self.steps, self.cutoffs, self.time, self.longest
+        self.time = 0.0
+        while self.time < seconds:
+            elapsed = self.time
+            self.best_direction(snake[0], (0, 0), snake, budget_ms)
+            elapsed = self.time - elapsed
+            self.steps_per_ms *= min(2.0, margin * budget_ms / (1000 * elapsed))
+        self.rng = rng
+        self.calls, self.rollouts, self.steps, self.cutoffs, self.time, self.longest = totals
+        return self.steps_per_ms
+
+    def best_move(self, game, budget_ms=2.0):  # best_direction() of a SnakeGame, as a vel
+        direction = self.best_direction(game.head, game.food, game.snake, budget_ms)
+        return None if direction is None else self.moves[direction]
+
+    def best_direction(self, head, food, snake, budget_ms=2.0):
+        # head and food as (i, j) and the snake as a list of them, head first. Returns the direction (up, down,
+        # left, right) whose playouts survived the most steps on average, the one closer to the food among equals,
+        # or None when no move is safe. Playouts stop at depth steps or when the steps the budget pays for are used
+        # up
+        start = time.perf_counter()
+        deadline = start + budget_ms / 1000
+        width, offsets = self.width, self.offsets
+        head_i, head_j = head
+        food_i, food_j = food
+        head = (head_i + 1) * width + head_j + 1
+        food = (food_i + 1) * width + food_j + 1
+        length = len(snake)
+        free_at = self.border.copy()
+        snake = np.array(snake)
+        free_at[(snake[:, 0] + 1) * width + snake[:, 1] + 1] = np.minimum(np.arange(length, 0, -1), 127)
+        first_moves = [move for move, offset in enumerate(offsets) if free_at[head + offset] == 0]
+        if not first_moves:
+            return None
+
+        playouts = self.playouts
+        n = playouts * len(first_moves)
+        if len(self.entered) < n * self.cells:
+            self.entered = np.zeros(n * self.cells, dtype=np.int8)
+        entered = self.entered
+        rows = np.arange(n)[:, None] * self.cells  # start of the row of each playout in entered
+        row_moves = np.arange(n) * 4  # start of the row of each playout in the flattened (n x 4) arrays
+        heads = np.repeat(head + offsets[first_moves], playouts)
+        entered[rows[:, 0] + heads] = min(1 + length, 127)
+        ate = heads == food
+        tail_moves = (1 - ate.astype(np.int8))[:, None]  # moves that didn't eat, as a column
+        alive = np.ones(n, dtype=bool)
+        survived = np.ones(n, dtype=np.int32)
+        depth = min(self.depth, max(2, int(budget_ms * self.steps_per_ms / n)))
+        picks = self.rng.integers(0, 12, (depth, n), dtype=np.int8)
+        steps = 1
+        while steps < depth:
+            if time.perf_counter() > deadline:
+                self.cutoffs += 1
+                break
+            cells = heads[:, None] + offsets
+            free = np.maximum(free_at[cells], entered[rows + cells]) <= tail_moves
+            # The 4 free flags of a row read as one uint32 and turned into a 4 bit mask, then a random pick
+            # among the free moves of that mask
+            mask = (free.view(np.uint32).ravel() * FREE_MASK_MULTIPLIER) >> 24
+            choice = RANDOM_FREE_MOVE[mask * 12 + picks[steps]]
+            alive &= choice >= 0
+            if not alive.any():
+                break
+            steps += 1
+            heads = np.where(alive, cells.ravel()[row_moves + choice], heads)
+            entered[rows[:, 0] + heads] = min(steps + length, 127)  # dead playouts only write over their own head
+            eats = heads == food
+            tail_moves[:, 0] += alive & ~(eats & ~ate)
+            ate |= eats
+            survived += alive
+        entered[:n * self.cells] = 0
+
+        survival = survived.reshape(len(first_moves), playouts).mean(axis=1)
+        best = max(range(len(first_moves)), key=lambda m: (
+            survival[m], -abs(head_i + self.moves[first_moves[m]][0] - food_i)
+            - abs(head_j + self.moves[first_moves[m]][1] - food_j)))
+        elapsed = time.perf_counter() - start
+        self.calls += 1
+        self.rollouts += n
+        self.steps += n * steps
+        self.time += elapsed
+        self.longest = max(self.longest, elapsed)
+        return first_moves[best]
+
+
+class BatchPlanner():
+    # next moves of a stack of boards at once, for when many games are stepped together. Each board is a SnakeGame
+    # board (> 0 is body) with a border of blocked cells around it and all of them sit end to end in one flat array,
+    # so one breadth first search runs on every board in lockstep: a level shifts the whole frontier by the offset
+    # of each direction and the border keeps it from leaving its board. The search starts from the food. A board is
+    # done once a cell next to its head is reached, its move goes to that cell and all of its cells are closed so
+    # its part of the frontier dies out. On a 4-connected grid A* with the manhattan distance finds shortest paths
+    # too, so the path lengths are those of astar_search; the moves may differ between paths of the same length
+
+    def __init__(self, height, width):
+        self.height = height
+        self.width = width + 2
+        self.cells = (height + 2) * self.width  # per board
+        self.offsets = np.array([-self.width, self.width, -1, 1])  # get_safe_moves order: up, down, left, right
+        self.moves = np.array([[-1, 0], [1, 0], [0, -1], [0, 1]])
+        self.open = np.zeros(0, dtype=bool)
+        self.dist = np.zeros(0, dtype=np.int16)
+        self.levels = 0
+
+    def plan(self, boards, heads, foods):
+        # boards (n, height, width), heads and foods (n, 2); returns the moves (n, 2) and the path lengths, 0 where
+        # the food can't be reached and the move is left at [0, 0] for the caller to fall back on
+        n = len(boards)
+        if len(self.open) != n * self.cells:
+            self.open = np.zeros(n * self.cells, dtype=bool)
+            self.dist = np.zeros(n * self.cells, dtype=np.int16)
+        is_open, dist, offsets = self.open, self.dist, self.offsets
+        is_open.reshape(n, self.height + 2, self.width)[:, 1:-1, 1:-1] = boards <= 0
+        dist.fill(-1)
+        base = np.arange(n) * self.cells
+        heads = base + (heads[:, 0] + 1) * self.width + heads[:, 1] + 1
+        frontier = base + (foods[:, 0] + 1) * self.width + foods[:, 1] + 1
+        head_neighbors = heads[:, None] + offsets
+        is_open[frontier] = False
+        dist[frontier] = 0
+        board_cells = is_open.reshape(n, self.cells)
+        active = np.arange(n)  # boards still searching
+        level = 0
+        while True:
+            done = (dist[head_neighbors[active]] >= 0).any(1)
+            if done.any():
+                board_cells[active[done]] = False  # closed, so their part of the frontier dies out
+                active = active[~done]
+            if not len(frontier) or not len(active):
+                break
+            level += 1
+            reached = []
+            for offset in offsets:
+                cells = frontier + offset
+                cells = cells[is_open[cells]]
+                is_open[cells] = False
+                reached.append(cells)
+            frontier = np.concatenate(reached)
+            dist[frontier] = level
+        self.levels += level
+
+        neighbor_dist = dist[head_neighbors].astype(np.int32)
+        neighbor_dist[neighbor_dist < 0] = self.cells
+        best = neighbor_dist.argmin(1)
+        path_lengths = neighbor_dist[np.arange(n), best] + 1
+        found = path_lengths <= self.cells
+        return np.where(found[:, None], self.moves[best], 0), np.where(found, path_lengths, 0)
+
 
 class SnakeGameGUI(SnakeGame):
 
@@ -97,13 +495,51 @@ class SnakeGameGUI(SnakeGame):
         self.HEIGHT = self.SQUARESIZE * self.height  # height= 150
         self.SIZE = (self.WIDTH + 400, self.HEIGHT)  # SIZE = 550x150
 
+        # performance HUD below the score in the side area, fed by ring buffers of the last samples
+        self.HUD_TOP = 120
+        self.HUD_INTERVAL = 0.25  # seconds between HUD redraws
+        self.plan_times = RingBuffer()
+        self.nodes = RingBuffer()
+        self.path_lengths = RingBuffer()
+        self.frame_times = RingBuffer()
+        self.tick_times = RingBuffer()
+        self.hud_drawn = 0.0
+        self.hud_font = None
+
         if headless_mode == False:
             self.SCREEN = pygame.display.set_mode(self.SIZE)
             pygame.init()
 
+    def record_plan(self, seconds):  # time of one player_ai() call, with the work the search reported
+        self.plan_times.append(seconds)
+        self.nodes.append(getattr(self, "nodes_expanded", 0))
+        self.path_lengths.append(getattr(self, "path_length", 0))
+
+    def draw_hud(self):
+        now = time.perf_counter()
+        if now - self.hud_drawn < self.HUD_INTERVAL:
+            return
+        self.hud_drawn = now
+        if self.hud_font is None:
+            self.hud_font = pygame.font.SysFont("monospace", 16)
+
+        lines = [f"astar_search p50 {1000 * self.plan_times.percentile(0.5):7.2f} ms",
+                 f"             p99 {1000 * self.plan_times.percentile(0.99):7.2f} ms",
+                 f"nodes/move   avg {self.nodes.mean():7.1f}",
+                 f"ticks/sec        {self.tick_times.rate():7.1f}",
+                 f"frame time   p50 {1000 * self.frame_times.percentile(0.5):7.2f} ms",
+                 f"             p99 {1000 * self.frame_times.percentile(0.99):7.2f} ms",
+                 f"path length  avg {self.path_lengths.mean():7.1f}"]
+        pygame.draw.rect(self.SCREEN, self.BLACK, (self.WIDTH, self.HUD_TOP, 400, self.HEIGHT - self.HUD_TOP))
+        for i, line in enumerate(lines):
+            label = self.hud_font.render(line, 1, (200, 200, 200))
+            self.SCREEN.blit(label, (self.WIDTH + 10, self.HUD_TOP + i * 20))
+
     def draw_board(self):
         myfont = pygame.font.SysFont("monospace", 50)
-        self.SCREEN.fill(self.BLACK)
+        # the HUD below the score is only cleared when it is redrawn
+        self.SCREEN.fill(self.BLACK, (0, 0, self.SIZE[0], self.HUD_TOP))
+        self.SCREEN.fill(self.BLACK, (0, self.HUD_TOP, self.WIDTH, self.HEIGHT - self.HUD_TOP))
         for i in range(self.height):
             for j in range(self.width):
                 # check for head, body, food
@@ -119,6 +555,7 @@ class SnakeGameGUI(SnakeGame):
 
         label = myfont.render(f"Score: {self.score}", 1, self.PURPLE)
         self.SCREEN.blit(label, (self.WIDTH + 10, 10))
+        self.draw_hud()
         loc_size = (self.WIDTH, 0, 3, self.HEIGHT)
         pygame.draw.rect(self.SCREEN, (255, 255, 255), loc_size)
         pygame.display.update()
@@ -155,9 +592,12 @@ class SnakeGameGUI(SnakeGame):
             if counter >= update_rate:
                 self.update_vel(vel)
                 self.update_state()
+                self.tick_times.append(time.perf_counter())
                 counter = 0
+            frame_start = time.perf_counter()
             self.draw_board()
             pygame.display.update()
+            self.frame_times.append(time.perf_counter() - frame_start)
 
         label = myfont.render(f"Game Over!", 1, self.RED)
         self.SCREEN.blit(label, (self.WIDTH + 10, 50))
@@ -243,12 +683,17 @@ class SnakeGameAI(SnakeGameGUI):
             counter += 1
             if counter >= update_rate:
                 if player_ai != None:
+                    plan_start = time.perf_counter()
                     vel = player_ai()
+                    self.record_plan(time.perf_counter() - plan_start)
                 self.update_vel(vel)
                 self.update_state()
+                self.tick_times.append(time.perf_counter())
                 counter = 0
+            frame_start = time.perf_counter()
             self.draw_board()
             pygame.display.update()
+            self.frame_times.append(time.perf_counter() - frame_start)
 
         label = myfont.render(f"Game Over!", 1, self.RED)
         self.SCREEN.blit(label, (self.WIDTH + 10, 50))
@@ -267,6 +712,20 @@ class SnakeGameAStar(SnakeGameAI):
         super().__init__(headless_mode)
         self.path2food = []
 
+        # cells are numbered i * width + j, neighbor_cells[cell] lists the cells next to it in get_safe_moves order
+        self.neighbor_cells = [[(i + di) * self.width + j + dj for di, dj in [[-1, 0], [1, 0], [0, -1], [0, 1]]
+                                if 0 <= i + di < self.height and 0 <= j + dj < self.width]
+                               for i in range(self.height) for j in range(self.width)]
+        self.search_root = None  # state of anytime_search kept between ticks, see resume_search()
+        self.field = DistanceField(self.neighbor_cells)  # distances to food for field_search()
+        self.field_tail = None
+        self.searches = 0  # astar_search calls
+        self.frontier_bfs = FrontierBFS(self.height, self.width)  # for frontier_search()
+        self.transpositions = TranspositionTable()  # for cached_search(), can be shared between games
+        # seeded from the state of rand, so rand.seed() before a game fixes the playouts too without drawing from rand
+        self.rollout_planner = RolloutPlanner(self.height, self.width, seed=rand.getstate()[1])
+        self.rollout_budget_ms = 2.0  # time for playouts when there is no path to the food, 0 to head for the last
+        # explored cell instead
 
     def wiggle_away(self):
         moves = [[-1, 0], [1, 0], [0, -1], [0, 1]]
@@ -319,80 +778,215 @@ class SnakeGameAStar(SnakeGameAI):
                 self.board[i, j] == 0 or self.board[i, j] == -1]
 
     def heuristic(self, head):
-        # distance to food
-        d0 = self.food[0] - head[0]
-        d1 = self.food[1] - head[1]
-        # pythagoras rule
-        return np.sqrt(d0 ** 2 + d1 ** 2)
-
-    def astar_explore(self, temp_head):
-        self.explored.append(temp_head)
-
-        moves = self.get_safe_moves(temp_head)
-
-        for move in moves:
-            head = temp_head.copy()
-            head[0] += move[0]
-            head[1] += move[1]
-            h = self.heuristic(head)
-
-            if str(head) not in self.parents.keys():
-                self.parents[str(head)] = temp_head
-
-            if head in self.explored:
-                continue
-
-            if self.check4food(head):
-                self.food_found = True
-                return
-            if [h, head] not in self.not_explored:
-                self.not_explored.insert(0, [h, head])
-                self.not_explored.sort()
+        # manhattan distance to food, consistent on a 4-connected grid so the search finds shortest paths
+        return abs(self.food[0] - head[0]) + abs(self.food[1] - head[1])
 
     def astar_search(self, temp_head=None):
-        self.food_found = False
-        # not_explored represents open list
-        self.not_explored = []
-        # explored represents closed list
-        self.explored = []
-        self.parents = dict()
+        # A* of astar_cells() from the head (or temp_head) to the food, with the snake as the blocked cells
+        self.searches += 1
+        width = self.width
         if temp_head == None:
-            temp_head = self.head.copy()
-        orig_head = temp_head.copy()
-
-        moves = self.get_safe_moves(temp_head)
-
-        for move in moves:
-            head = temp_head.copy()
-            head[0] += move[0]
-            head[1] += move[1]
-            h = self.heuristic(head)
-            if str(head) not in self.parents.keys():
-                self.parents[str(head)] = temp_head
-            if self.check4food(head):
-                return move
-            else:
-                self.not_explored.insert(0, [h, head])
-                self.not_explored.sort()
-
-        while len(self.not_explored) > 0:
-            h_th = self.not_explored.pop(0)
-            self.astar_explore(h_th[1])
-            if self.food_found:
-                break
-
-        if self.food_found:  # back track to move
-            loc = self.food
-            while self.parents[str(loc)] != orig_head:
-                loc = self.parents[str(loc)]
-            return [loc[0] - orig_head[0], loc[1] - orig_head[1]]
-        elif len(self.explored) > 0:
-            loc = self.explored[-1]  # last point
-            while self.parents[str(loc)] != orig_head:
-                loc = self.parents[str(loc)]
-            return [loc[0] - orig_head[0], loc[1] - orig_head[1]]
+            temp_head = self.head
+        root = temp_head[0] * width + temp_head[1]
+        food = self.food[0] * width + self.food[1]
+        blocked = {i * width + j for i, j in self.snake}
+        parents, g, self.nodes_expanded, food_found, last_explored = astar_cells(root, food, blocked,
+                                                                                 self.neighbor_cells, width)
+        self.path_length = 0
+        if food_found:  # back track to move
+            loc = food
+            self.path_length = g[food]
+        elif last_explored is not None:
+            if temp_head is self.head and self.rollout_budget_ms:
+                move = self.rollout_planner.best_move(self, self.rollout_budget_ms)
+                if move is not None:
+                    return move
+            loc = last_explored  # last point
         else:  # no path to food, no path to far point
             return self.wiggle_away()
+        loc = first_step(parents, root, loc)
+        return [loc // width - temp_head[0], loc % width - temp_head[1]]
+
+    def field_search(self):
+        # moves to the free neighbor of the head closest to the food on a distance field from the food, the field
+        # is kept between ticks and only built again when the food moves or the body changes the region around the
+        # food, so most ticks are a few lookups instead of a search. Falls back to astar_search when the food
+        # can't be reached
+        width = self.width
+        field = self.field
+        head = self.head[0] * width + self.head[1]
+        tail = self.snake[-1][0] * width + self.snake[-1][1]
+        field.block(head)
+        if self.field_tail is not None and self.field_tail != tail:
+            field.free(self.field_tail)
+        self.field_tail = tail
+
+        builds = field.builds
+        path = field.path(head, self.food[0] * width + self.food[1], (i * width + j for i, j in self.snake))
+        if not path:
+            return self.astar_search()
+        self.nodes_expanded = field.reached if field.builds != builds else 0
+        self.path_length = len(path)
+        return [path[0] // width - self.head[0], path[0] % width - self.head[1]]
+
+    def cached_search(self):
+        # astar_search through the transposition table: the search only depends on the head, the body cells and the
+        # food, so a board with the same Zobrist hash gets the move found for it before. Moves of wiggle_away depend
+        # on more than the board and are not stored
+        entry = self.transpositions.get(self.hash)
+        if entry is not None:
+            vel, self.nodes_expanded, self.path_length, self.search_time = entry
+            return list(vel)
+        start = time.perf_counter()
+        vel = self.astar_search()
+        self.search_time = time.perf_counter() - start
+        if self.nodes_expanded:
+            self.transpositions.put(self.hash, (tuple(vel), self.nodes_expanded, self.path_length, self.search_time))
+        return vel
+
+    def frontier_search(self):
+        # astar_search done as a breadth first search that expands the whole frontier at once with NumPy, see
+        # frontier_bfs.py. Finds paths as short as astar_search and is faster on very large boards. Falls back to
+        # astar_search when the food can't be reached
+        width = self.width
+        head = self.head[0] * width + self.head[1]
+        path = self.frontier_bfs.search(head, self.food[0] * width + self.food[1],
+                                        (i * width + j for i, j in self.snake))
+        if not path:
+            return self.astar_search()
+        self.nodes_expanded = 0
+        self.path_length = len(path)
+        return [path[0] // width - self.head[0], path[0] % width - self.head[1]]
+
+    def search_heuristic(self, cell, food):
+        # heuristic() on cell ids
+        return abs(cell // self.width - food // self.width) + abs(cell % self.width - food % self.width)
+
+    def new_search(self, root, food):
+        # the search tree of anytime_search, kept between ticks: parent, children and g (depth) of every cell
+        # reached, the first move of the branch each cell is in, and the (closest h, cells) of every branch
+        self.search_parent = {}
+        self.search_children = {}
+        self.search_g = {root: 0}
+        self.search_branch = {}
+        self.search_ranking = {}
+        self.search_open = [(self.search_heuristic(root, food), 0, root)]  # heap of (g + h, -g, cell)
+        self.search_closed = set()
+
+    def add_to_search(self, cell, node, cell_g, food):
+        # cell reached from node, keeps the branch ranking up to date so it never has to walk the tree
+        self.search_parent[cell] = node
+        self.search_children.setdefault(node, set()).add(cell)
+        self.search_g[cell] = cell_g
+        first = cell if node == self.search_root else self.search_branch[node]
+        self.search_branch[cell] = first
+        h = self.search_heuristic(cell, food)
+        ranking = self.search_ranking.get(first)
+        if ranking is None:
+            self.search_ranking[first] = [h, 1]
+        else:
+            ranking[0] = min(ranking[0], h)
+            ranking[1] += 1
+        return h
+
+    def resume_search(self, root, food, blocked, deadline=None, max_copied=None):
+        # keeps the search tree of the last anytime_search when the snake made the move at the root of that tree
+        # towards a child of it without eating: the cells below that child were free and still are (the body only
+        # gave up its tail), so the subtree of the new head is a valid search from it. Otherwise starts over. When
+        # copying the subtree runs past the deadline or past max_copied cells, the cells still waiting to be copied
+        # are left open without their children and the search finds those again
+        if self.search_root is None or self.search_food != food or self.search_length != len(self.snake) \
+                or self.search_parent.get(root) != self.search_root:
+            self.search_root = root
+            self.new_search(root, food)
+        else:
+            old_children, old_branch, old_closed = self.search_children, self.search_branch, self.search_closed
+            self.search_root = root
+            self.new_search(root, food)
+            open_list, closed = self.search_open, self.search_closed
+            open_list.clear()
+            stack = [root]
+            copied = 0
+            while stack:
+                copied += 1
+                node = stack.pop()
+                node_g = self.search_g[node]
+                if max_copied is not None and copied > max_copied \
+                        or deadline is not None and copied & 31 == 0 and time.perf_counter() >= deadline:
+                    for cell in stack + [node]:
+                        cell_g = self.search_g[cell]
+                        open_list.append((cell_g + self.search_heuristic(cell, food), -cell_g, cell))
+                    break
+                # expanded cells next to a cell that was dropped with the rest of the tree (or next to the cell the
+                # tail left) are expanded again so those cells are found from this root
+                if node in old_closed and all(n in blocked or old_branch.get(n) == root or n == root
+                                              for n in self.neighbor_cells[node]):
+                    closed.add(node)
+                else:
+                    open_list.append((node_g + self.search_heuristic(node, food), -node_g, node))
+                for child in old_children.get(node, ()):
+                    self.add_to_search(child, node, node_g + 1, food)
+                    stack.append(child)
+            heapq.heapify(self.search_open)
+        self.search_food = food
+        self.search_length = len(self.snake)
+
+    def anytime_search(self, budget_us=None, budget_nodes=None):
+        # astar_search with a bound on its work: stops after budget_us microseconds or budget_nodes expansions and
+        # returns the move towards the most promising part of the search, the next tick continues the same search
+        # when resume_search() can keep it. Keeping the tree may use up to half of budget_us or copy up to budget_nodes
+        # cells, the branches are ranked as cells are added, so nothing outside the budget walks the tree
+        width = self.width
+        root = self.head[0] * width + self.head[1]
+        food = self.food[0] * width + self.food[1]
+        blocked = {i * width + j for i, j in self.snake}
+        start = time.perf_counter()
+        deadline = None if budget_us is None else start + budget_us / 1e6
+        self.resume_search(root, food, blocked, None if budget_us is None else start + budget_us / 2e6, budget_nodes)
+        g, children, open_list, closed = self.search_g, self.search_children, self.search_open, self.search_closed
+
+        expanded = 0
+        while open_list and food not in closed:
+            if budget_nodes is not None and expanded >= budget_nodes:
+                break
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            f, node_g, node = heapq.heappop(open_list)
+            node_g = -node_g
+            if node in closed or node_g != g[node]:  # expanded already or reached on a shorter path since
+                continue
+            closed.add(node)
+            expanded += 1
+            if node == food:
+                break
+            child_g = node_g + 1
+            for cell in self.neighbor_cells[node]:
+                if cell in blocked or cell in closed:
+                    continue
+                cell_g = g.get(cell)
+                if cell_g is not None:
+                    if child_g >= cell_g or cell in children:
+                        continue
+                    # a shorter path to a cell that was reached but not expanded, it moves to this node
+                    children[self.search_parent[cell]].discard(cell)
+                    self.search_ranking[self.search_branch[cell]][1] -= 1
+                h = self.add_to_search(cell, node, child_g, food)
+                heapq.heappush(open_list, (child_g + h, -child_g, cell))
+        self.nodes_expanded = expanded
+
+        # first move of the path to the food, or of the branch whose cells came closest to the food, the branch
+        # that reached more cells wins a tie
+        self.path_length = 0
+        if food in closed:
+            move = self.search_branch[food]
+            self.path_length = g[food]
+        elif self.search_ranking:
+            ranking = self.search_ranking
+            move = min(ranking, key=lambda first: (ranking[first][0], -ranking[first][1]))
+        else:  # no free cell next to the head
+            self.search_root = None
+            return self.wiggle_away()
+        return [move // width - self.head[0], move % width - self.head[1]]
 
     def run_game(self, player_ai=None):
         update_rate = 1
@@ -426,12 +1020,17 @@ class SnakeGameAStar(SnakeGameAI):
             counter += 1
             if counter >= update_rate:
                 if player_ai != None:
+                    plan_start = time.perf_counter()
                     vel = player_ai()
+                    self.record_plan(time.perf_counter() - plan_start)
                 self.update_vel(vel)
                 self.update_state()
+                self.tick_times.append(time.perf_counter())
                 counter = 0
+            frame_start = time.perf_counter()
             self.draw_board()
             pygame.display.update()
+            self.frame_times.append(time.perf_counter() - frame_start)
 
         label = myfont.render(f"Game Over!", 1, self.RED)
         self.SCREEN.blit(label, (self.WIDTH + 10, 50))
@@ -444,9 +1043,534 @@ class SnakeGameAStar(SnakeGameAI):
         pygame.quit()
 
 
+def speculative_worker(conn, shm_name, height, width):
+    # runs astar_search for SpeculativePlanner on the states it writes to shared memory, until it sends None
+    shm = shared_memory.SharedMemory(name=shm_name)
+    state = np.ndarray((6 + height * width,), dtype=np.int32, buffer=shm.buf)
+    game = SnakeGameAStar(headless_mode=True)
+    while True:
+        request_id = conn.recv()
+        if request_id is None:
+            break
+        # state: request id, head, food, length of the snake, then its cells head first as i * width + j
+        length = int(state[5])
+        game.snake = [list(divmod(int(cell), width)) for cell in state[6:6 + length]]
+        game.head = [int(state[1]), int(state[2])]
+        game.food = [int(state[3]), int(state[4])]
+        move = game.astar_search()
+        conn.send((request_id, move, game.nodes_expanded, game.path_length))
+    del state
+    shm.close()
+
+
+class SpeculativePlanner():
+    # plans the next move in a worker process while the current one is applied and drawn
+    # after choosing a move for tick t, the state after that move is predicted and written to shared memory and
+    # the worker starts searching from it. At tick t+1 the result is used if the prediction was right, otherwise it
+    # is discarded and astar_search runs here as before. Moves that eat the food are not speculated on since the
+    # next food position is random
+
+    def __init__(self, game):
+        self.game = game
+        self.shm = shared_memory.SharedMemory(create=True, size=4 * (6 + game.height * game.width))
+        self.state = np.ndarray((6 + game.height * game.width,), dtype=np.int32, buffer=self.shm.buf)
+        self.conn, worker_conn = multiprocessing.Pipe()
+        self.worker = multiprocessing.Process(target=speculative_worker,
+                                              args=(worker_conn, self.shm.name, game.height, game.width),
+                                              daemon=True)
+        self.worker.start()
+        self.pending = None  # [request id, predicted snake, predicted food] of the search in the worker
+        self.request_id = 0
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+
+    def next_move(self):  # player_ai for run_game
+        game = self.game
+        move = None
+        if self.pending is not None:
+            request_id, snake, food = self.pending
+            self.pending = None
+            reply = self.conn.recv()
+            if reply[0] == request_id and snake == game.snake and food == game.food:
+                move = reply[1]
+                game.nodes_expanded, game.path_length = reply[2], reply[3]
+                self.hits += 1
+            else:  # prediction was wrong, the result is dropped
+                self.misses += 1
+        if move is None:
+            move = game.astar_search()
+        self.speculate(move)
+        return move
+
+    def speculate(self, move):
+        game = self.game
+        head = [game.head[0] + move[0], game.head[1] + move[1]]
+        if head[0] < 0 or head[0] >= game.height or head[1] < 0 or head[1] >= game.width \
+                or head in game.snake or head == game.food:
+            self.skipped += 1
+            return
+        snake = [head] + [s.copy() for s in game.snake[:-1]]
+
+        self.request_id += 1
+        state = self.state
+        state[0:6] = (self.request_id, head[0], head[1], game.food[0], game.food[1], len(snake))
+        state[6:6 + len(snake)] = [i * game.width + j for i, j in snake]
+        self.conn.send(self.request_id)
+        self.pending = [self.request_id, snake, game.food.copy()]
+
+    def close(self):
+        if self.pending is not None:
+            self.conn.recv()
+        self.conn.send(None)
+        self.worker.join()
+        del self.state
+        self.shm.close()
+        self.shm.unlink()
+
+
+class AStarPolicy:
+    # astar_search of SnakeGameAStar as a policy for the shared game core (snake_core.SnakeCore): the same A*
+    # (astar_cells) on the cell ids of the core, playouts when there is no path to the food and wiggle_away when no
+    # move is safe
+
+    def __init__(self, seed=None):
+        # without a seed the policy follows random.seed(), so a seeded run plays the same game again
+        self.rand = random.Random(random.random() if seed is None else seed)
+        self.reverse = 1
+        self.rollout_budget_ms = 2.0  # time for playouts when there is no path to the food, 0 to head for the last
+        # explored cell instead. Playouts don't know about wrap boards, those always head for the last explored cell
+        self.neighbor_cells = None  # next_cell of the game without the walls, set by reset()
+        self.rollout_planner = None
+
+    def reset(self, game):
+        self.neighbor_cells = [[cell for cell in cells if cell >= 0] for cells in game.next_cell]
+        self.rollout_planner = RolloutPlanner(game.rows, game.cols, seed=self.rand.getrandbits(64))
+
+    def wiggle_away(self, game):
+        head, grid, cols = game.head, game.grid, game.cols
+        d0 = head // cols - game.food // cols
+        d1 = head % cols - game.food % cols
+        food_dir = []
+        if d0 != 0:
+            food_dir.append(0 if d0 < 0 else 1)
+        if d1 != 0:
+            food_dir.append(2 if d1 < 0 else 3)
+
+        moves = [d for d, cell in enumerate(game.next_cell[head]) if cell >= 0 and grid[cell] != BODY]
+
+        self.reverse *= -1  # to alternate turning direction
+        for move in moves[::self.reverse]:
+            if move in food_dir:
+                return move
+
+        if len(moves) == 0:  # no safe moves
+            return 1
+        return self.rand.choice(moves)
+
+    def act(self, game):
+        if self.neighbor_cells is None:
+            self.reset(game)
+        head, food = game.head, game.food
+        body = list(game.body_cells())
+        parents, g, expanded, food_found, last_explored = astar_cells(head, food, set(body), self.neighbor_cells,
+                                                                      game.cols)
+        if food_found:  # back track to move
+            loc = food
+        elif last_explored is not None:
+            if self.rollout_budget_ms and not game.wrap:
+                move = self.rollout_planner.best_direction(game.position(head), game.position(food),
+                                                           [game.position(cell) for cell in body],
+                                                           self.rollout_budget_ms)
+                if move is not None:
+                    return move
+            loc = last_explored  # last point
+        else:  # no path to food, no path to far point
+            return self.wiggle_away(game)
+        return game.next_cell[head].index(first_step(parents, head, loc))
+
+
+def benchmark_speculation(ticks=2000, frame_time=1.0 / 60):
+    # planner latency seen by the game loop per tick, with astar_search called in the loop and with the
+    # SpeculativePlanner; drawing a frame is stood in for by sleeping frame_time after every update
+    for speculate in (False, True):
+        rand.seed(0)
+        game = SnakeGameAStar(headless_mode=True)
+        planner = SpeculativePlanner(game) if speculate else None
+        player_ai = planner.next_move if speculate else game.astar_search
+        times = []
+        search_times = []
+        for tick in range(ticks):
+            start = time.perf_counter()
+            vel = player_ai()
+            times.append(time.perf_counter() - start)
+            game.update_vel(vel)
+            game.update_state()
+            if not game.game_state:
+                rand.seed(tick)
+                game.__init__(headless_mode=True)
+            time.sleep(frame_time)
+        if planner:
+            planner.close()
+        times.sort()
+        line = f"{'speculative' if speculate else 'in loop':12} mean {1000 * sum(times) / ticks:6.3f} ms  " \
+               f"p50 {1000 * times[ticks // 2]:6.3f} ms  p99 {1000 * times[int(ticks * 0.99)]:6.3f} ms"
+        if planner:
+            line += f"  hits {planner.hits}  misses {planner.misses}  not speculated {planner.skipped}"
+        print(line)
+
+
+def benchmark_astar(ticks=3000):
+    # expansions per move and time per expansion of astar_search over seeded games
+    rand.seed(0)
+    game = SnakeGameAStar(headless_mode=True)
+    elapsed = 0.0
+    expanded = 0
+    path_length = 0
+    paths = 0
+    for tick in range(ticks):
+        start = time.perf_counter()
+        vel = game.astar_search()
+        elapsed += time.perf_counter() - start
+        expanded += game.nodes_expanded
+        if game.path_length:
+            path_length += game.path_length
+            paths += 1
+        game.update_vel(vel)
+        game.update_state()
+        if not game.game_state:
+            rand.seed(tick)
+            game.__init__(headless_mode=True)
+    print(f"expansions/move {expanded / ticks:.1f}  us/expansion {1e6 * elapsed / max(expanded, 1):.2f}  "
+          f"ms/move {1000 * elapsed / ticks:.3f}  path length {path_length / max(paths, 1):.2f}")
+
+
+def benchmark_anytime(ticks=3000):
+    # worst case tick latency of astar_search against anytime_search with a budget, on the same seeded games
+    planners = [("astar_search", lambda game: game.astar_search),
+                ("anytime 2000 us", lambda game: lambda: game.anytime_search(budget_us=2000)),
+                ("anytime 200 nodes", lambda game: lambda: game.anytime_search(budget_nodes=200))]
+    for name, make_planner in planners:
+        rand.seed(0)
+        game = SnakeGameAStar(headless_mode=True)
+        player_ai = make_planner(game)
+        times = []
+        expanded = 0
+        score = 0
+        deaths = 0
+        for tick in range(ticks):
+            start = time.perf_counter()
+            vel = player_ai()
+            times.append(time.perf_counter() - start)
+            expanded += game.nodes_expanded
+            game.update_vel(vel)
+            game.update_state()
+            if not game.game_state:
+                score += game.score
+                deaths += 1
+                rand.seed(tick)
+                game.__init__(headless_mode=True)
+        score += game.score
+        times.sort()
+        print(f"{name:18} p50 {1000 * times[ticks // 2]:6.3f} ms  p99 {1000 * times[int(ticks * 0.99)]:6.3f} ms  "
+              f"max {1000 * times[-1]:6.3f} ms  nodes/tick {expanded / ticks:6.1f}  food {score}  deaths {deaths}")
+
+
+def benchmark_field(ticks=3000):
+    # searches per tick and time per tick of astar_search against field_search on the same seeded games
+    planners = [("astar_search", lambda game: game.astar_search),
+                ("field_search", lambda game: game.field_search)]
+    for name, make_planner in planners:
+        rand.seed(0)
+        game = SnakeGameAStar(headless_mode=True)
+        player_ai = make_planner(game)
+        elapsed = 0.0
+        searches = 0
+        score = 0
+        for tick in range(ticks):
+            start = time.perf_counter()
+            vel = player_ai()
+            elapsed += time.perf_counter() - start
+            game.update_vel(vel)
+            game.update_state()
+            if not game.game_state:
+                score += game.score
+                searches += game.searches + game.field.builds
+                rand.seed(tick)
+                game.__init__(headless_mode=True)
+        score += game.score
+        searches += game.searches + game.field.builds
+        print(f"{name:14} searches/tick {searches / ticks:5.2f}  ms/tick {1000 * elapsed / ticks:6.3f}  food {score}")
+
+
+def benchmark_frontier(ticks=1000):
+    # path lengths and time per move of astar_search and frontier_search from the same positions of seeded games
+    rand.seed(0)
+    game = SnakeGameAStar(headless_mode=True)
+    elapsed = [0.0, 0.0]
+    compared = 0
+    for tick in range(ticks):
+        start = time.perf_counter()
+        vel = game.astar_search()
+        elapsed[0] += time.perf_counter() - start
+        astar_length = game.path_length
+        start = time.perf_counter()
+        game.frontier_search()
+        elapsed[1] += time.perf_counter() - start
+        if astar_length:
+            assert game.path_length == astar_length, f"path lengths differ at tick {tick}"
+            compared += 1
+        game.update_vel(vel)
+        game.update_state()
+        if not game.game_state:
+            rand.seed(tick)
+            game.__init__(headless_mode=True)
+    print(f"{game.height}x{game.width}: astar_search {1000 * elapsed[0] / ticks:.3f} ms/move  "
+          f"frontier_search {1000 * elapsed[1] / ticks:.3f} ms/move  same path length in {compared} moves")
+
+
+def benchmark_transpositions(games=1000):
+    # hit rate of one transposition table shared by all games and the planner time it saved, a game ends when the
+    # snake dies or goes height * width moves without eating
+    table = TranspositionTable()
+    planner_time = 0.0
+    saved = 0.0
+    moves = 0
+    score = 0
+    for game_number in range(games):
+        rand.seed(game_number)
+        game = SnakeGameAStar(headless_mode=True)
+        game.transpositions = table
+        moves_without_food = 0
+        while game.game_state and moves_without_food < game.height * game.width:
+            hits = table.hits
+            start = time.perf_counter()
+            vel = game.cached_search()
+            planner_time += time.perf_counter() - start
+            if table.hits != hits:
+                saved += game.search_time
+            game.update_vel(vel)
+            food = game.score
+            game.update_state()
+            moves_without_food = 0 if game.score != food else moves_without_food + 1
+            moves += 1
+        score += game.score
+    lookups = table.hits + table.misses
+    print(f"{games} games, {moves} moves, average score {score / games:.1f}: hit rate {table.hits / lookups:.3%} "
+          f"({table.hits} of {lookups}), "
+          f"planner time {planner_time:.2f} s, searches saved {saved:.2f} s ({saved / (planner_time + saved):.1%})")
+
+
+def benchmark_rollouts(games=50, budgets=(0, 2.0, 5.0)):
+    # seeded games with the last explored cell as the fallback when there is no path to the food (budget 0) and
+    # with playouts under each time budget, a game ends when the snake dies or goes height * width moves without
+    # eating
+    for budget in budgets:
+        score = moves = deaths = 0
+        calls = rollouts = steps = cutoffs = 0
+        planner_time = longest = 0.0
+        for game_number in range(games):
+            rand.seed(game_number)
+            game = SnakeGameAStar(headless_mode=True)
+            game.rollout_budget_ms = budget
+            moves_without_food = 0
+            while game.game_state and moves_without_food < game.height * game.width:
+                game.update_vel(game.astar_search())
+                food = game.score
+                game.update_state()
+                moves_without_food = 0 if game.score != food else moves_without_food + 1
+                moves += 1
+            score += game.score
+            deaths += not game.game_state
+            planner = game.rollout_planner
+            calls += planner.calls
+            rollouts += planner.rollouts
+            steps += planner.steps
+            cutoffs += planner.cutoffs
+            planner_time += planner.time
+            longest = max(longest, planner.longest)
+        line = f"budget {budget:3.1f} ms: average score {score / games:6.1f}  deaths {deaths}/{games}  moves {moves}"
+        if calls:
+            line += f"  fallbacks {calls}  rollouts/sec {rollouts / planner_time:,.0f}  " \
+                    f"rollout steps/ms {steps / (1000 * planner_time):,.0f}  ms/fallback " \
+                    f"{1000 * planner_time / calls:.2f}  max {1000 * longest:.2f}  cut off {cutoffs}"
+        print(line)
+
+
+def lookahead_nodes(game, depth):
+    # nodes of the tree of moves that keep the snake alive for depth moves, walked with apply_move and undo_move
+    nodes = 1
+    if depth:
+        for vel in MOVES:
+            if [game.head[0] + vel[0], game.head[1] + vel[1]] != game.snake[1]:
+                if game.apply_move(vel):
+                    nodes += lookahead_nodes(game, depth - 1)
+                game.undo_move()
+    return nodes
+
+
+def lookahead_nodes_restored(game, depth):
+    # the same tree, going back up with restore() of a snapshot instead of undo_move
+    nodes = 1
+    if depth:
+        state = game.snapshot()
+        for vel in MOVES:
+            if [game.head[0] + vel[0], game.head[1] + vel[1]] != game.snake[1]:
+                if game.apply_move(vel):
+                    nodes += lookahead_nodes_restored(game, depth - 1)
+                game.restore(state)
+    return nodes
+
+
+def benchmark_lookahead(positions=50, budget_ms=1.0, max_depth=20):
+    # depth of the full lookahead tree searched within budget_ms, deepening one move at a time, and nodes per ms
+    # from positions of seeded astar_search games, with restore() of snapshots against apply_move and undo_move
+    rand.seed(0)
+    game = SnakeGameAStar(headless_mode=True)
+    states = []
+    tick = 0
+    while len(states) < positions:
+        game.update_vel(game.astar_search())
+        game.update_state()
+        tick += 1
+        if not game.game_state:
+            rand.seed(tick)
+            game.__init__(headless_mode=True)
+        elif tick % 20 == 0:
+            states.append(game.snapshot())
+    counts = []
+    for name, walk in [("snapshot/restore", lookahead_nodes_restored), ("apply/undo", lookahead_nodes)]:
+        depths = nodes = 0
+        elapsed = 0.0
+        counts.append([])
+        for state in states:
+            game.restore(state)
+            counts[-1].append([])
+            depth = 0
+            while depth < max_depth:
+                start = time.perf_counter()
+                count = walk(game, depth + 1)
+                seconds = time.perf_counter() - start
+                nodes += count
+                elapsed += seconds
+                counts[-1][-1].append(count)
+                if seconds > budget_ms / 1000:
+                    break
+                depth += 1
+            assert game.snapshot() == state, "lookahead changed the game"
+            depths += depth
+        print(f"{name:16}: depth {depths / len(states):4.1f} in {budget_ms} ms, "
+              f"{nodes / (1000 * elapsed):6.0f} nodes/ms, {len(state)} byte snapshots")
+    for restored, undone in zip(*counts):
+        n = min(len(restored), len(undone))
+        assert restored[:n] == undone[:n], "the trees differ"
+
+
+def benchmark_batch(sizes=(64, 256, 1024, 4096), seconds=1.0):
+    # moves planned per second by BatchPlanner for stacks of boards from seeded games against astar_search on the
+    # same boards one at a time, and a check that the path lengths are the same
+    positions = []  # board, head, food, path length of astar_search
+    scalar_time = 0.0
+    game_number = 0
+    while len(positions) < max(sizes):
+        rand.seed(game_number)
+        game = SnakeGameAStar(headless_mode=True)
+        game.rollout_budget_ms = 0
+        moves_without_food = 0
+        while game.game_state and moves_without_food < game.height * game.width and len(positions) < max(sizes):
+            board, head, food = game.board.copy(), game.head.copy(), game.food.copy()
+            start = time.perf_counter()
+            vel = game.astar_search()
+            scalar_time += time.perf_counter() - start
+            positions.append((board, head, food, game.path_length))
+            game.update_vel(vel)
+            score = game.score
+            game.update_state()
+            moves_without_food = 0 if game.score != score else moves_without_food + 1
+        game_number += 1
+    print(f"astar_search: {len(positions) / scalar_time:,.0f} moves/sec over {len(positions)} boards")
+
+    planner = BatchPlanner(30, 30)
+    for size in sizes:
+        boards = np.stack([position[0] for position in positions[:size]])
+        heads = np.array([position[1] for position in positions[:size]])
+        foods = np.array([position[2] for position in positions[:size]])
+        calls = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < seconds or calls < 3:
+            moves, path_lengths = planner.plan(boards, heads, foods)
+            calls += 1
+        elapsed = time.perf_counter() - start
+        assert path_lengths.tolist() == [position[3] for position in positions[:size]], "path lengths differ"
+        print(f"batch of {size:4}: {size * calls / elapsed:9,.0f} moves/sec, {1000 * elapsed / calls:7.2f} ms per "
+              f"batch, same path lengths as astar_search")
+
+
 def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seed", type=int, help="seed for the food positions and random moves")
+    parser.add_argument("--speculate", action="store_true", help="plan the next move in a worker process")
+    parser.add_argument("--budget-us", type=int, help="anytime search with this many microseconds per move")
+    parser.add_argument("--budget-nodes", type=int, help="anytime search with this many expansions per move")
+    parser.add_argument("--field", action="store_true", help="read moves off a distance field from the food")
+    parser.add_argument("--numpy-bfs", action="store_true", help="search with the NumPy frontier BFS")
+    parser.add_argument("--transpositions", action="store_true", help="reuse moves of boards seen before")
+    parser.add_argument("--benchmark",
+                        choices=["astar", "speculation", "anytime", "field", "frontier", "transpositions",
+                                 "rollouts", "lookahead", "batch"])
+    parser.add_argument("--games", type=int, help="games of the transpositions (1000) and rollouts (50) benchmarks")
+    parser.add_argument("--rollout-ms", type=float, default=2.0,
+                        help="time for playouts when there is no path to the food, 0 for the old fallback")
+    parser.add_argument("--rollout-rate", type=float, default=PLAYOUT_STEPS_PER_MS,
+                        help="playout steps per ms the budget is turned into, the same rate repeats a seeded game; "
+                             "0 to measure it on this machine")
+    args = parser.parse_args()
+    if args.seed is not None:
+        rand.seed(args.seed)
+    if args.benchmark == "astar":
+        benchmark_astar()
+        return
+    if args.benchmark == "speculation":
+        benchmark_speculation()
+        return
+    if args.benchmark == "anytime":
+        benchmark_anytime()
+        return
+    if args.benchmark == "field":
+        benchmark_field()
+        return
+    if args.benchmark == "frontier":
+        benchmark_frontier()
+        return
+    if args.benchmark == "transpositions":
+        benchmark_transpositions(args.games or 1000)
+        return
+    if args.benchmark == "rollouts":
+        benchmark_rollouts(args.games or 50)
+        return
+    if args.benchmark == "lookahead":
+        benchmark_lookahead()
+        return
+    if args.benchmark == "batch":
+        benchmark_batch()
+        return
     my_game = SnakeGameAStar()
-    my_game.run_game(my_game.astar_search)
+    my_game.rollout_budget_ms = args.rollout_ms
+    my_game.rollout_planner.steps_per_ms = args.rollout_rate or my_game.rollout_planner.calibrate()
+    if args.speculate:
+        planner = SpeculativePlanner(my_game)
+        my_game.run_game(planner.next_move)
+        planner.close()
+    elif args.transpositions:
+        my_game.run_game(my_game.cached_search)
+    elif args.numpy_bfs:
+        my_game.run_game(my_game.frontier_search)
+    elif args.field:
+        my_game.run_game(my_game.field_search)
+    elif args.budget_us is not None or args.budget_nodes is not None:
+        my_game.run_game(lambda: my_game.anytime_search(args.budget_us, args.budget_nodes))
+    else:
+        my_game.run_game(my_game.astar_search)
 
 
 if __name__ == "__main__":
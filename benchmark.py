@@ -0,0 +1,77 @@
+import argparse
+import importlib.util
+import os
+import random
+import time
+
+from snake_core import SnakeCore, play
+
+# Plays every solver as a policy on the shared game core, headless, and reports score and speed
+# Run with: python benchmark.py [--games N] [--size ROWS]
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Solver: (script, policy class)
+SOLVERS = {'a-star': ('A star.py', 'AStarPolicy'),
+           'best-first': ('best first.py', 'bestFirstPolicy'),
+           'breadth-first': ('breadth first.py', 'BFSPolicy'),
+           'hamilton': ('hamilton.py', 'HamiltonPolicy')}
+
+
+def load_script(file_name):  # The scripts have spaces in their names, so they are loaded from their paths
+    name = os.path.splitext(file_name)[0].replace(' ', '_')
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, file_name))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_policy(solver):
+    file_name, class_name = SOLVERS[solver]
+    return getattr(load_script(file_name), class_name)
+
+
+def new_game(policy_class, rows, seed):
+    # A seeded rows x rows game and a new policy for it, returns (game, policy)
+    random.seed(seed)  # Policies that use the random module (maze of the hamiltonian cycle)
+    policy = policy_class()
+    game = SnakeCore(rows, rows, wrap=getattr(policy, 'wrap', False),
+                     start_length=getattr(policy, 'start_length', 3), seed=seed)
+    return game, policy
+
+
+def benchmark_solver(policy_class, games, rows):
+    score = wins = steps = 0
+    elapsed = 0.0
+    for game_seed in range(games):
+        game, policy = new_game(policy_class, rows, game_seed)
+        start = time.perf_counter()
+        play(game, policy)
+        elapsed += time.perf_counter() - start
+        score += game.score
+        wins += game.won
+        steps += game.steps
+    return score / games, wins, steps, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the solvers on the shared game core')
+    parser.add_argument('--games', type=int, default=5)
+    parser.add_argument('--size', type=int, default=20, help='rows and columns of the board, must be even')
+    parser.add_argument('solvers', nargs='*', default=list(SOLVERS), help=', '.join(SOLVERS))
+    args = parser.parse_args()
+    for solver in args.solvers:
+        if solver not in SOLVERS:
+            parser.error('unknown solver %s' % solver)
+
+    print('%d games per solver on a %dx%d board' % (args.games, args.size, args.size))
+    print('%-14s %10s %6s %10s %12s %10s' % ('solver', 'avg score', 'wins', 'steps', 'steps/sec', 'us/step'))
+    for solver in args.solvers:
+        score, wins, steps, elapsed = benchmark_solver(load_policy(solver), args.games, args.size)
+        print('%-14s %10.1f %6d %10d %12.0f %10.1f' % (solver, score, wins, steps, steps / elapsed,
+                                                       1e6 * elapsed / steps))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,7 @@
-import math, random, pygame, sys, copy
+import math, random, pygame, sys, copy, time, os
+
+from bitboard import Bitboard
+from snake_core import BODY, OPPOSITE
 
 class cube(object):
     # dimensions of window
@@ -171,17 +174,46 @@ class snake(object):
             else:
                 c.draw(surface)
 
+# fonts and rendered text are cached, SysFont does a system font lookup every time it is called
+fonts = {}
+text_surfaces = {}
+score_surface = [None, None]  # [score, surface] of the last rendered score
+
+
+def getFont(name, size, bold=False):
+    key = (name, size, bold)
+    if key not in fonts:
+        fonts[key] = pygame.font.SysFont(name, size, bold=bold)
+    return fonts[key]
+
+
+# renders a string once and reuses the surface for every following frame
+def renderText(text, name, size, color, bold=False):
+    key = (text, name, size, tuple(color), bold)
+    if key not in text_surfaces:
+        text_surfaces[key] = getFont(name, size, bold).render(text, True, color)
+    return text_surfaces[key]
+
+
+def clearTextCache():
+    fonts.clear()
+    text_surfaces.clear()
+    score_surface[0] = score_surface[1] = None
+
+
 def drawScore(score):
-    score_font = pygame.font.SysFont('Raleway', 20, bold=True)
-    score_surface = score_font.render('Score : ' + str(score), True, pygame.Color(153, 255, 51))
-    score_rect = score_surface.get_rect()
+    # the score surface is only rendered again when the score changes
+    if score_surface[0] != score:
+        score_font = getFont('Raleway', 20, bold=True)
+        score_surface[0] = score
+        score_surface[1] = score_font.render('Score : ' + str(score), True, pygame.Color(153, 255, 51))
+    score_rect = score_surface[1].get_rect()
     score_rect.topleft = (width - 120, 10)
-    win.blit(score_surface, score_rect)
+    win.blit(score_surface[1], score_rect)
 
 
 def drawPressKeyMsg():
-    press_font = pygame.font.SysFont('Raleway', 255)
-    pressKeySurf = press_font.render('Press a key to play.', True, (255, 255, 255))
+    pressKeySurf = renderText('Press a key to play.', 'Raleway', 255, (255, 255, 255))
     pressKeyRect = pressKeySurf.get_rect()
     pressKeyRect.midtop = (250, 350)
     win.blit(pressKeySurf, pressKeyRect)
@@ -211,9 +243,8 @@ def randomSnack(rows, item):
 
 
 def showGameOverScreen():
-    gameOverFont = pygame.font.SysFont("courier new", 150)
-    gameSurf = gameOverFont.render('Game', True, pygame.Color(255, 255, 255))
-    overSurf = gameOverFont.render('Over', True, pygame.Color(255, 255, 255))
+    gameSurf = renderText('Game', "courier new", 150, pygame.Color(255, 255, 255))
+    overSurf = renderText('Over', "courier new", 150, pygame.Color(255, 255, 255))
     gameRect = gameSurf.get_rect()
     overRect = overSurf.get_rect()
     gameRect.midtop = (width / 2, 10)
@@ -408,6 +439,50 @@ def manhattan_dis(p, q, size=0):
     return dx + dy
 
 
+# best_first_search as a policy for the shared game core (snake_core.SnakeCore) on a board that wraps around,
+# x runs along the columns of the core and y along its rows
+# keeps the ranking of the moves by (body in the way, distance to the snack) and the visited set, but not the
+# look-ahead along the rows and columns that is written for the 20x20 board. Instead of it a move into a pocket,
+# a region of free cells smaller than the snake, counts like body in the way; the regions come from bitboard
+# flood fills, one per region around the head
+class bestFirstPolicy(object):
+    wrap = True
+    start_length = 1
+
+    def reset(self, game):
+        self.visited = set()
+        self.score = game.score
+        self.board = Bitboard(game.rows, game.cols, wrap=True)
+
+    def act(self, game):
+        if game.score != self.score:
+            self.visited = set()
+            self.score = game.score
+        curr_posy, curr_posx = game.position(game.head)
+        snack_pos = tuple(reversed(game.position(game.food)))
+        free = self.board.from_grid(game.grid)
+        regions = []
+        best = []
+        for name, move, x, y in (('left', 2, curr_posx - 1, curr_posy), ('right', 3, curr_posx + 1, curr_posy),
+                                 ('up', 0, curr_posx, curr_posy - 1), ('down', 1, curr_posx, curr_posy + 1)):
+            cell = game.next_cell[game.head][move]
+            if game.grid[cell] == BODY:
+                prio = 1
+            else:
+                region = next((region for region in regions if region >> cell & 1), None)
+                if region is None:
+                    region = self.board.flood_fill(1 << cell, free)
+                    regions.append(region)
+                prio = 1 if region.bit_count() < game.length else 0
+            best.append((name, manhattan_dis((x, y), snack_pos, size=game.rows), cell, prio, move))
+        best = sorted(best, key=lambda t: (t[3], t[1]))
+        for p in best:
+            if p[4] != OPPOSITE[game.direction] and p[:4] not in self.visited:
+                self.visited.add(p[:4])
+                return p[4]
+        return game.direction
+
+
 def main():
     global width, rows, s, snack, win, visited
     pygame.init()
@@ -443,4 +518,41 @@ def main():
 
         redrawWindow()
 
-main()
\ No newline at end of file
+
+# measures the time spent in redrawWindow, with the text cache and with it cleared before every frame
+def benchmarkFrameTime(frames=500):
+    global width, rows, s, snack, win
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    pygame.init()
+    width = 500
+    rows = 20
+    win = pygame.display.set_mode((width, width))
+    s = snake((255, 255, 51), (10, 10))
+    for i in range(30):
+        s.addCube()
+    snack = cube(randomSnack(rows, s), color=(255, 51, 51))
+
+    for cached in (False, True):
+        clearTextCache()
+        times = []
+        for frame in range(frames):
+            if not cached:
+                clearTextCache()
+            start = time.perf_counter()
+            redrawWindow()
+            times.append(time.perf_counter() - start)
+        times.sort()
+        print('%-8s mean %.3f ms  p50 %.3f ms  p99 %.3f ms' % (
+            'cached' if cached else 'uncached', 1000 * sum(times) / frames,
+            1000 * times[frames // 2], 1000 * times[int(frames * 0.99)]))
+    pygame.quit()
+
+
+if __name__ == '__main__':
+    # --seed N makes the start position and the snacks repeat from run to run
+    if '--seed' in sys.argv:
+        random.seed(int(sys.argv[sys.argv.index('--seed') + 1]))
+    if '--benchmark' in sys.argv:
+        benchmarkFrameTime()
+    else:
+        main()
\ No newline at end of file
@@ -0,0 +1,124 @@
+import argparse
+import time
+from random import Random
+
+from snake_core import BODY
+
+# Sets of cells as Python ints, bit r * cols + c stands for the cell (r, c) like the cell ids of snake_core
+# A flood fill grows the reached set by shifting the whole board one cell in each direction and masking with the
+# free cells. Every step is a handful of big int operations however many cells the frontier holds, so "cells
+# reachable from X" takes one step per cell of distance to the farthest reachable cell instead of one visit per cell
+# Benchmark with: python bitboard.py [--sizes 30 256] [--seconds S]
+
+FREE_DIGITS = bytes(ord('0') if value == BODY else ord('1') for value in range(256))  # Grid byte to binary digit
+
+
+class Bitboard:
+    def __init__(self, rows, cols, wrap=False):
+        self.rows = rows
+        self.cols = cols
+        self.size = rows * cols
+        self.wrap = wrap  # Cells on opposite edges are next to each other, like SnakeCore(wrap=True)
+        self.full = (1 << self.size) - 1
+        self.first_col = int(('0' * (cols - 1) + '1') * rows, 2)
+        self.last_col = self.first_col << cols - 1
+        self.first_row = (1 << cols) - 1
+        self.last_row = self.first_row << self.size - cols
+        self.not_first_col = self.full ^ self.first_col
+        self.not_last_col = self.full ^ self.last_col
+
+    def from_cells(self, cells):
+        digits = bytearray(b'0') * self.size
+        size = self.size - 1
+        for cell in cells:
+            digits[size - cell] = 49  # '1'
+        return int(digits, 2)
+
+    def from_grid(self, grid):  # Cells of a SnakeCore grid that aren't body
+        return int(grid.translate(FREE_DIGITS)[::-1], 2)
+
+    def cells(self, bits):  # Cell ids in the set, in increasing order
+        digits = format(bits, 'b')[::-1]
+        cells = []
+        cell = digits.find('1')
+        while cell >= 0:
+            cells.append(cell)
+            cell = digits.find('1', cell + 1)
+        return cells
+
+    def spread(self, bits):  # Cells next to a cell of the set
+        cols = self.cols
+        near = bits << cols | bits >> cols | (bits & self.not_last_col) << 1 | (bits & self.not_first_col) >> 1
+        if self.wrap:
+            shift = self.size - cols
+            near |= ((bits & self.last_row) >> shift | (bits & self.first_row) << shift |
+                     (bits & self.last_col) >> cols - 1 | (bits & self.first_col) << cols - 1)
+        return near & self.full
+
+    def flood_fill(self, start, free):  # Cells reachable from the start cells through free cells, start included
+        reached = frontier = start
+        unreached = free & ~start
+        while frontier:
+            frontier = self.spread(frontier) & unreached
+            unreached ^= frontier
+            reached |= frontier
+        return reached
+
+
+# Flood fills from a free cell of a rows x rows grid where a third of the cells are blocked, and through a body
+# laid out in rows like a snake that fills the board, bitboard against GridBFS.flood_fill of breadth first.py
+def benchmark_flood_fill(sizes=(30, 256), seconds=1.0):
+    from benchmark import load_script
+    grid_bfs = load_script('breadth first.py').GridBFS
+    for rows in sizes:
+        rng = Random(0)
+        board = Bitboard(rows, rows)
+        bfs = grid_bfs(rows)
+        cells = list(range(rows * rows))
+        random_blocked = rng.sample(cells, rows * rows // 3)
+        # Every other row is body except for one cell at alternating ends, the free cells form one long corridor
+        corridor_blocked = [r * rows + c for r in range(1, rows, 2) for c in range(rows)
+                            if c != (rows - 1 if r % 4 == 1 else 0)]
+        for layout, blocked in (('random', random_blocked), ('corridor', corridor_blocked)):
+            free = board.full ^ board.from_cells(blocked)
+            # Start from the free cell nearest to the middle of the board that reaches a quarter of the board
+            start = next(cell for cell in sorted(cells, key=lambda cell: abs(cell - rows * rows // 2))
+                         if free >> cell & 1 and board.flood_fill(1 << cell, free).bit_count() > rows * rows // 4)
+
+            runs = 0
+            start_time = time.perf_counter()
+            while time.perf_counter() - start_time < seconds:
+                reached_cells = bfs.flood_fill(start, blocked)
+                runs += 1
+            bfs_time = (time.perf_counter() - start_time) / runs
+
+            runs = 0
+            start_time = time.perf_counter()
+            while time.perf_counter() - start_time < seconds:
+                reached = board.flood_fill(1 << start, free)
+                runs += 1
+            bitboard_time = (time.perf_counter() - start_time) / runs
+
+            runs = 0
+            start_time = time.perf_counter()
+            while time.perf_counter() - start_time < seconds:
+                reached = board.flood_fill(1 << start, board.full ^ board.from_cells(blocked))
+                runs += 1
+            converted_time = (time.perf_counter() - start_time) / runs
+
+            assert set(board.cells(reached)) == reached_cells
+            print('{0}x{0} {1:8}: {2} cells reached, BFS {3:9.1f} us, bitboard {4:9.1f} us, '
+                  'bitboard with the blocked list converted {5:9.1f} us'.format(
+                      rows, layout, len(reached_cells), 1e6 * bfs_time, 1e6 * bitboard_time, 1e6 * converted_time))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bitboard flood fill against the cell by cell BFS')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[30, 256])
+    parser.add_argument('--seconds', type=float, default=1.0, help='time spent on each measurement')
+    args = parser.parse_args()
+    benchmark_flood_fill(args.sizes, args.seconds)
+
+
+if __name__ == '__main__':
+    main()
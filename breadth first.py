@@ -1,7 +1,15 @@
 from os import environ
+import argparse
+import time
 import pygame
-from copy import deepcopy
-from random import randrange
+from array import array
+from collections import deque
+from itertools import islice
+from random import randrange, Random, seed
+
+from bitboard import Bitboard
+from frontier_bfs import FrontierBFS
+from snake_core import BODY, DistanceField
 
 # Dimensions
 WIDTH = 612   # Width of game surface
@@ -16,7 +24,6 @@ GRID_CLR = (20, 20, 20)
 SNAKE_CLR = (0,0 , 255)
 APPLE_CLR = (255, 0, 0)
 HEAD_CLR = (255, 255, 255)
-VIRTUAL_SNAKE_CLR = (255, 0, 0)
 
 # Game Settings
 FPS = 15  # Frames per second
@@ -24,22 +31,56 @@ INITIAL_SNAKE_LENGTH = 3
 WAIT_SECONDS_AFTER_WIN = 15  # If snake wins the game, wait for this amount of seconds before restarting
 MAX_MOVES_WITHOUT_EATING = ROWS * ROWS * ROWS * 2  # Snake will die after this amount of moves without eating apple
 SNAKE_MAX_LENGTH = ROWS * ROWS - INITIAL_SNAKE_LENGTH  # Max number of apples snake can eat
+HAMILTON_COVERAGE = 0.5  # Snake follows a Hamiltonian cycle once its body covers this share of the board
 
 # Variables used in BFS algorithm
 GRID = [[i, j] for i in range(ROWS) for j in range(ROWS)]
+CELL_POSITIONS = [tuple(pos) for pos in GRID]  # CELL_POSITIONS[cell_id(pos)] == tuple(pos)
+
+
+# A cell id is the index of a position in GRID
+def cell_id(position):
+    return position[0] * ROWS + position[1]
+
+
+def in_grid(position):
+    return 0 <= position[0] < ROWS and 0 <= position[1] < ROWS
+
+
+NEIGHBOR_TABLES = {}  # Board size: neighbor table, see neighbor_table()
+
+
+def neighbor_table(rows):  # neighbor_table(rows)[cell] = ids of the cells next to it, in get_neighbors order
+    if rows not in NEIGHBOR_TABLES:
+        table = []
+        for x in range(rows):
+            for y in range(rows):
+                neighbors = []
+                if x + 1 < rows:
+                    neighbors.append((x + 1) * rows + y)
+                if x > 0:
+                    neighbors.append((x - 1) * rows + y)
+                if y + 1 < rows:
+                    neighbors.append(x * rows + y + 1)
+                if y > 0:
+                    neighbors.append(x * rows + y - 1)
+                table.append(neighbors)
+        NEIGHBOR_TABLES[rows] = table
+    return NEIGHBOR_TABLES[rows]
+
+
+NEIGHBORS = neighbor_table(ROWS)
 
 
 # Helper functions
 def get_neighbors(position):
+    if in_grid(position):
+        return [list(CELL_POSITIONS[n]) for n in NEIGHBORS[cell_id(position)]]
     neighbors = [[position[0] + 1, position[1]],
                  [position[0] - 1, position[1]],
                  [position[0], position[1] + 1],
                  [position[0], position[1] - 1]]
-    in_grid_neighbors = []
-    for pos in neighbors:
-        if pos in GRID:
-            in_grid_neighbors.append(pos)
-    return in_grid_neighbors
+    return [pos for pos in neighbors if in_grid(pos)]
 
 
 def distance(pos1, pos2):
@@ -48,8 +89,186 @@ def distance(pos1, pos2):
     return abs(x2 - x1) + abs(y2 - y1)
 
 
-# Each position is a tuple because python doesn't allow hashing lists
-ADJACENCY_DICT = {tuple(pos): get_neighbors(pos) for pos in GRID}
+class GridBFS:
+    # Breadth first search over the cell ids of a rows x rows grid
+    # The queue, visited and prev arrays are allocated once, a generation counter marks the cells visited by the
+    # current search so nothing has to be cleared between searches
+    def __init__(self, rows):
+        self.rows = rows
+        self.neighbors = neighbor_table(rows)
+        self.visited = [0] * (rows * rows)
+        self.prev = [0] * (rows * rows)
+        self.queue = [0] * (rows * rows)
+        self.generation = 0
+        self.calls = 0
+
+    def search(self, start, end, blocked):  # Shortest path from start to end (start excluded), [] if there is none
+        self.calls += 1
+        self.generation += 1
+        generation = self.generation
+        visited, prev, queue, neighbors = self.visited, self.prev, self.queue, self.neighbors
+
+        # Blocked cells are marked as visited so the search never enters them
+        for cell in blocked:
+            visited[cell] = generation
+        visited[start] = generation
+        if visited[end] == generation:
+            return []
+
+        queue[0] = start
+        q_head, q_tail = 0, 1
+        while q_head < q_tail:  # While queue is not empty
+            node = queue[q_head]
+            q_head += 1
+            for next_node in neighbors[node]:
+                if visited[next_node] != generation:
+                    visited[next_node] = generation
+                    prev[next_node] = node
+                    if next_node == end:
+                        path = [end]
+                        while node != start:
+                            path.append(node)
+                            node = prev[node]
+                        path.reverse()
+                        return path
+                    queue[q_tail] = next_node
+                    q_tail += 1
+
+        return []  # Path not available
+
+    def flood_fill(self, start, blocked):  # Set of cells reachable from start without entering blocked cells
+        self.calls += 1
+        self.generation += 1
+        generation = self.generation
+        visited, queue, neighbors = self.visited, self.queue, self.neighbors
+
+        for cell in blocked:
+            visited[cell] = generation
+        visited[start] = generation
+
+        queue[0] = start
+        q_head, q_tail = 0, 1
+        while q_head < q_tail:
+            for next_node in neighbors[queue[q_head]]:
+                if visited[next_node] != generation:
+                    visited[next_node] = generation
+                    queue[q_tail] = next_node
+                    q_tail += 1
+            q_head += 1
+
+        return set(queue[:q_tail])
+
+
+BFS = GridBFS(ROWS)
+
+
+# Hamiltonian cycle through the board as a list of positions, like hamilton.py the snake follows it to fill the board
+# hamilton.py builds its cycle around a maze of half the board size, which needs an even number of rows. For an odd
+# number of rows no cycle through every cell exists, so this one leaves out the corner (0, 0) and passes
+# (1, 0) -> (1, 1) -> (0, 1), which lets the snake take (1, 0) -> (0, 0) -> (0, 1) when the apple is in the corner
+def hamiltonian_cycle(rows):
+    if rows % 2 == 0:
+        cycle = [[0, y] for y in range(rows)]
+        first_column = 1
+    else:
+        cycle = [[1, 0]]
+        for y in range(1, rows):  # Zigzag through the first two columns
+            cycle += [[1, y], [0, y]] if y % 2 else [[0, y], [1, y]]
+        first_column = 2
+    for x in range(first_column, rows):
+        cycle += [[x, y] for y in (range(rows - 1, 0, -1) if (x - first_column) % 2 == 0 else range(1, rows))]
+    cycle += [[x, 0] for x in range(rows - 1, first_column - 1, -1)]
+    return cycle
+
+
+HAMILTON_CYCLE = hamiltonian_cycle(ROWS)
+SPARE_CELL = None if ROWS % 2 == 0 else cell_id([0, 0])  # Cell left out of the cycle
+# CYCLE_NEXT[0][cell] is the cell after it on the cycle, CYCLE_NEXT[1][cell] the cell after it on the reversed cycle
+# CYCLE_DETOUR[direction] is the cell from which the snake enters the spare cell
+CYCLE_NEXT = ([0] * (ROWS * ROWS), [0] * (ROWS * ROWS))
+for i, pos in enumerate(HAMILTON_CYCLE):
+    CYCLE_NEXT[0][cell_id(pos)] = cell_id(HAMILTON_CYCLE[(i + 1) % len(HAMILTON_CYCLE)])
+    CYCLE_NEXT[1][cell_id(pos)] = cell_id(HAMILTON_CYCLE[i - 1])
+CYCLE_DETOUR = (cell_id([1, 0]), cell_id([0, 1]))
+if SPARE_CELL is not None:
+    CYCLE_NEXT[0][SPARE_CELL] = cell_id([0, 1])
+    CYCLE_NEXT[1][SPARE_CELL] = cell_id([1, 0])
+
+
+def cycle_next(cell, direction, apple):  # Next cell on the cycle, through the spare cell when the apple is in it
+    return SPARE_CELL if apple == SPARE_CELL and cell == CYCLE_DETOUR[direction] else CYCLE_NEXT[direction][cell]
+
+
+class FreeCells:
+    # Cell ids not covered by the snake. The cells are kept in a list together with the index of each cell in that
+    # list, so a cell is added, removed or drawn at random in O(1)
+    def __init__(self, size, occupied=()):
+        self.cells = list(range(size))
+        self.index = list(range(size))  # -1 for occupied cells
+        for cell in occupied:
+            self.remove(cell)
+
+    def __len__(self):
+        return len(self.cells)
+
+    def __contains__(self, cell):
+        return self.index[cell] >= 0
+
+    def add(self, cell):
+        if self.index[cell] < 0:
+            self.index[cell] = len(self.cells)
+            self.cells.append(cell)
+
+    def remove(self, cell):
+        i = self.index[cell]
+        if i >= 0:
+            last = self.cells.pop()  # The last cell takes the place of the removed one
+            if last != cell:
+                self.cells[i] = last
+                self.index[last] = i
+            self.index[cell] = -1
+
+    def random_cell(self):
+        return self.cells[randrange(len(self.cells))]
+
+
+class VirtualBody:
+    # Cell ids of the snake (head first) that the planner moves around instead of building virtual snakes
+    # Every move is written to an undo log, rollback() reverts the moves made since mark() one by one
+    def __init__(self, cells, bfs=None):
+        self.cells = deque(cells)
+        self.log = []  # Tail cell removed by each move, None when the snake grew
+        self.bfs = bfs or BFS
+
+    def move(self, cell, grow=False):
+        self.cells.appendleft(cell)
+        self.log.append(None if grow else self.cells.pop())
+
+    def mark(self):
+        return len(self.log)
+
+    def rollback(self, mark):
+        while len(self.log) > mark:
+            tail = self.log.pop()
+            self.cells.popleft()
+            if tail is not None:
+                self.cells.append(tail)
+
+    def path_to_tail(self):  # BFS path from the head to the tail, the tail cell itself is not blocked
+        tail = self.cells.pop()
+        path = self.bfs.search(self.cells[0], tail, self.cells)
+        self.cells.append(tail)
+        return path
+
+
+# Rectangle drawn for a square relative to the corner of its cell, by the direction the square moved in
+# A square also covers the gap towards the square behind it so the snake looks connected
+SQUARE_RECTS = {(-1, 0): (GAP_SIZE, GAP_SIZE, SQUARE_SIZE, SQUARE_SIZE - 2 * GAP_SIZE),
+                 (1, 0): (-GAP_SIZE, GAP_SIZE, SQUARE_SIZE, SQUARE_SIZE - 2 * GAP_SIZE),
+                 (0, 1): (GAP_SIZE, -GAP_SIZE, SQUARE_SIZE - 2 * GAP_SIZE, SQUARE_SIZE),
+                 (0, -1): (GAP_SIZE, GAP_SIZE, SQUARE_SIZE - 2 * GAP_SIZE, SQUARE_SIZE)}
+CELL_RECT = (GAP_SIZE, GAP_SIZE, SQUARE_SIZE - 2 * GAP_SIZE, SQUARE_SIZE - 2 * GAP_SIZE)  # Tail and apple
+
 
 class Square:
     def __init__(self, pos, surface, is_apple=False):
@@ -63,35 +282,14 @@ class Square:
             self.dir = [0, 0]
 
     def draw(self, clr=SNAKE_CLR):
-        x, y = self.pos[0], self.pos[1]
-        ss, gs = SQUARE_SIZE, GAP_SIZE
-
-        if self.dir == [-1, 0]:
-            if self.is_tail:
-                pygame.draw.rect(self.surface, clr, (x * ss + gs, y * ss + gs, ss - 2*gs, ss - 2*gs))
-            else:
-                pygame.draw.rect(self.surface, clr, (x * ss + gs, y * ss + gs, ss, ss - 2*gs))
-
-        if self.dir == [1, 0]:
-            if self.is_tail:
-                pygame.draw.rect(self.surface, clr, (x * ss + gs, y * ss + gs, ss - 2*gs, ss - 2*gs))
-            else:
-                pygame.draw.rect(self.surface, clr, (x * ss - gs, y * ss + gs, ss, ss - 2*gs))
-
-        if self.dir == [0, 1]:
-            if self.is_tail:
-                pygame.draw.rect(self.surface, clr, (x * ss + gs, y * ss + gs, ss - 2*gs, ss - 2*gs))
-            else:
-                pygame.draw.rect(self.surface, clr, (x * ss + gs, y * ss - gs, ss - 2*gs, ss))
-
-        if self.dir == [0, -1]:
-            if self.is_tail:
-                pygame.draw.rect(self.surface, clr, (x * ss + gs, y * ss + gs, ss - 2*gs, ss - 2*gs))
-            else:
-                pygame.draw.rect(self.surface, clr, (x * ss + gs, y * ss + gs, ss - 2*gs, ss))
-
-        if self.is_apple:
-            pygame.draw.rect(self.surface, clr, (x * ss + gs, y * ss + gs, ss - 2*gs, ss - 2*gs))
+        if self.is_tail or self.is_apple:
+            rect = CELL_RECT
+        elif tuple(self.dir) in SQUARE_RECTS:
+            rect = SQUARE_RECTS[tuple(self.dir)]
+        else:
+            return
+        pygame.draw.rect(self.surface, clr, (self.pos[0] * SQUARE_SIZE + rect[0], self.pos[1] * SQUARE_SIZE + rect[1],
+                                             rect[2], rect[3]))
 
     def move(self, direction):
         self.dir = direction
@@ -114,7 +312,6 @@ class Snake:
         self.dir = [-1, 0]
         self.score = 0
         self.moves_without_eating = 0
-        self.apple = Square([randrange(ROWS), randrange(ROWS)], self.surface, is_apple=True)
 
         self.squares = []
         for pos in self.squares_start_pos:
@@ -124,19 +321,30 @@ class Snake:
         self.tail = self.squares[-1]
         self.tail.is_tail = True
 
-        self.path = []
-        self.is_virtual_snake = False
+        self.free_cells = None
+        self.rebuild_free_cells()
+        self.apple = None
+        self.generate_apple()
+
+        self.path = deque()
+        self.path_verified = False  # True when self.path leads to the apple and leaves a way back to the tail
         self.total_moves = 0
         self.won_game = False
 
+        self.plan_cache = {}  # Planner results of the current tick, see planned()
+        self.virtual_body = None
+        self.distance_field = DistanceField(NEIGHBORS)  # Distance to the apple from every cell, see apple_path()
+        self.bfs_runs = 0  # BFS searches run by the planner since the game started
+        self.planning_calls = 0
+        self.hamilton_coverage = HAMILTON_COVERAGE
+        self.cycle_moves = 0  # Moves made along the Hamiltonian cycle in a row
+        self.cycle_direction = 0  # Index into CYCLE_NEXT
+
     def draw(self):
         self.apple.draw(APPLE_CLR)
         self.head.draw(HEAD_CLR)
         for sqr in self.squares[1:]:
-            if self.is_virtual_snake:
-                sqr.draw(VIRTUAL_SNAKE_CLR)
-            else:
-                sqr.draw()
+            sqr.draw()
 
     def set_direction(self, direction):
         if direction == 'left':
@@ -177,7 +385,11 @@ class Snake:
                 elif keys[pygame.K_DOWN]:
                     self.set_direction('down')
 
+    def rebuild_free_cells(self):  # Only needed when self.squares is replaced, moves keep the index up to date
+        self.free_cells = FreeCells(ROWS * ROWS, [cell_id(sqr.pos) for sqr in self.squares if in_grid(sqr.pos)])
+
     def move(self):
+        old_tail = self.squares[-1].pos[:]
         for j, sqr in enumerate(self.squares):
             p = (sqr.pos[0], sqr.pos[1])
             if p in self.turns:
@@ -189,6 +401,12 @@ class Snake:
                 sqr.move(sqr.dir)
         self.moves_without_eating += 1
 
+        self.free_cells.add(cell_id(old_tail))
+        self.distance_field.free(cell_id(old_tail))
+        if in_grid(self.head.pos):
+            self.free_cells.remove(cell_id(self.head.pos))
+            self.distance_field.block(cell_id(self.head.pos))
+
     def add_square(self):
         self.squares[-1].is_tail = False
         tail = self.squares[-1]  # Tail before adding new square
@@ -205,6 +423,9 @@ class Snake:
 
         self.squares[-1].dir = direction
         self.squares[-1].is_tail = True  # Tail after adding new square
+        if in_grid(self.squares[-1].pos):
+            self.free_cells.remove(cell_id(self.squares[-1].pos))
+            self.distance_field.block(cell_id(self.squares[-1].pos))
 
     def reset(self):
         self.__init__(self.surface)
@@ -214,14 +435,13 @@ class Snake:
             if sqr.pos == self.head.pos:
                 return True
 
-    def generate_apple(self):
-        self.apple = Square([randrange(ROWS), randrange(ROWS)], self.surface, is_apple=True)
-        if not self.is_position_free(self.apple.pos):
-            self.generate_apple()
+    def generate_apple(self):  # Places the apple on a random free cell with a single draw
+        if not self.free_cells:  # Snake fills the board, the apple stays under the head until the game is won
+            return
+        self.apple = Square(list(CELL_POSITIONS[self.free_cells.random_cell()]), self.surface, is_apple=True)
 
     def eating_apple(self):
-        if self.head.pos == self.apple.pos and not self.is_virtual_snake and not self.won_game:
-            self.generate_apple()
+        if self.head.pos == self.apple.pos and not self.won_game:
             self.moves_without_eating = 0
             self.score += 1
             return True
@@ -237,94 +457,50 @@ class Snake:
             self.set_direction('down')
 
     def is_position_free(self, position):
-        if position[0] >= ROWS or position[0] < 0 or position[1] >= ROWS or position[1] < 0:
-            return False
-        for sqr in self.squares:
-            if sqr.pos == position:
-                return False
-        return True
+        return in_grid(position) and cell_id(position) in self.free_cells
 
     # Breadth First Search Algorithm
     def bfs(self, s, e):  # Find shortest path between (start_position, end_position)
-        q = [s]  # Queue
-        visited = {tuple(pos): False for pos in GRID}
-
-        visited[s] = True
-
-        # Prev is used to find the parent node of each node to create a feasible path
-        prev = {tuple(pos): None for pos in GRID}
-
-        while q:  # While queue is not empty
-            node = q.pop(0)
-            neighbors = ADJACENCY_DICT[node]
-            for next_node in neighbors:
-                if self.is_position_free(next_node) and not visited[tuple(next_node)]:
-                    q.append(tuple(next_node))
-                    visited[tuple(next_node)] = True
-                    prev[tuple(next_node)] = node
-
-        path = list()
-        p_node = e  # Starting from end node, we will find the parent node of each node
-
-        start_node_found = False
-        while not start_node_found:
-            if prev[p_node] is None:
-                return []
-            p_node = prev[p_node]
-            if p_node == s:
-                path.append(e)
-                return path
-            path.insert(0, p_node)
-
-        return []  # Path not available
-
-    def create_virtual_snake(self):  # Creates a copy of snake (same size, same position, etc..)
-        v_snake = Snake(self.surface)
-        for i in range(len(self.squares) - len(v_snake.squares)):
-            v_snake.add_square()
-
-        for i, sqr in enumerate(v_snake.squares):
-            sqr.pos = deepcopy(self.squares[i].pos)
-            sqr.dir = deepcopy(self.squares[i].dir)
-
-        v_snake.dir = deepcopy(self.dir)
-        v_snake.turns = deepcopy(self.turns)
-        v_snake.apple.pos = deepcopy(self.apple.pos)
-        v_snake.apple.is_apple = True
-        v_snake.is_virtual_snake = True
+        if not in_grid(e):
+            return []
+        blocked = [cell_id(sqr.pos) for sqr in self.squares if in_grid(sqr.pos)]
+        path = BFS.search(cell_id(s), cell_id(e), blocked)
+        return [CELL_POSITIONS[cell] for cell in path]
 
-        return v_snake
+    def apple_path(self):  # Path to the apple read off the distance field, [] if there is none
+        path = self.distance_field.path(cell_id(self.head.pos), cell_id(self.apple.pos),
+                                        (cell_id(sqr.pos) for sqr in self.squares if in_grid(sqr.pos)))
+        return [CELL_POSITIONS[cell] for cell in path]
 
     def get_path_to_tail(self):
-        tail_pos = deepcopy(self.squares[-1].pos)
-        self.squares.pop(-1)
-        path = self.bfs(tuple(self.head.pos), tuple(tail_pos))
-        self.add_square()
+        tail = self.squares.pop(-1)
+        path = self.bfs(tuple(self.head.pos), tuple(tail.pos))
+        self.squares.append(tail)  # Put the same tail back so the snake is left unchanged
         return path
 
     def get_available_neighbors(self, pos):
-        valid_neighbors = []
-        neighbors = get_neighbors(tuple(pos))
-        for n in neighbors:
-            if self.is_position_free(n) and self.apple.pos != n:
-                valid_neighbors.append(tuple(n))
-        return valid_neighbors
+        occupied = {cell_id(sqr.pos) for sqr in self.squares if in_grid(sqr.pos)}
+        occupied.add(cell_id(self.apple.pos))
+        return [CELL_POSITIONS[n] for n in NEIGHBORS[cell_id(pos)] if n not in occupied]
+
+    # The planners below work on self.virtual_body, set by set_path
+    def tail_reachable_cells(self):  # Cells the head can move to and still reach the tail afterwards
+        # Moving to a free neighbor frees the tail cell and makes the square before it the new tail. The head can
+        # then reach the new tail if both lie in the same region of cells not covered by the rest of the body, so a
+        # single flood fill from the new tail answers the question for every neighbor at once
+        cells = self.virtual_body.cells
+        return BFS.flood_fill(cells[-2], islice(cells, len(cells) - 2))
 
     def longest_path_to_tail(self):
         neighbors = self.get_available_neighbors(self.head.pos)
+        safe_cells = self.planned(self.tail_reachable_cells)
         path = []
         if neighbors:
             dis = -9999
             for n in neighbors:
-                if distance(n, self.squares[-1].pos) > dis:
-                    v_snake = self.create_virtual_snake()
-                    v_snake.go_to(n)
-                    v_snake.move()
-                    if v_snake.eating_apple():
-                        v_snake.add_square()
-                    if v_snake.get_path_to_tail():
-                        path.append(n)
-                        dis = distance(n, self.squares[-1].pos)
+                if distance(n, self.squares[-1].pos) > dis and cell_id(n) in safe_cells:
+                    path.append(n)
+                    dis = distance(n, self.squares[-1].pos)
             if path:
                 return [path[-1]]
 
@@ -333,99 +509,243 @@ class Snake:
         path = []
         if neighbors:
             path.append(neighbors[randrange(len(neighbors))])
-            v_snake = self.create_virtual_snake()
-            for move in path:
-                v_snake.go_to(move)
-                v_snake.move()
-            if v_snake.get_path_to_tail():
+            if cell_id(path[0]) in self.planned(self.tail_reachable_cells):
                 return path
             else:
-                return self.get_path_to_tail()
+                return self.planned(self.get_path_to_tail)
+
+    def planned(self, planner):  # Result of a planner method, computed at most once per tick
+        if planner.__name__ not in self.plan_cache:
+            self.plan_cache[planner.__name__] = planner()
+        return self.plan_cache[planner.__name__]
 
     def set_path(self):
+        self.plan_cache = {}
+        self.path_verified = False
+
         # If there is only 1 apple left for snake to win and it's adjacent to head
-        if self.score == SNAKE_MAX_LENGTH - 1 and self.apple.pos in get_neighbors(self.head.pos):
+        if self.score == SNAKE_MAX_LENGTH - 1 and cell_id(self.apple.pos) in NEIGHBORS[cell_id(self.head.pos)]:
             winning_path = [tuple(self.apple.pos)]
             print('Snake is about to win..')
             return winning_path
 
-        v_snake = self.create_virtual_snake()
+        self.virtual_body = VirtualBody(cell_id(sqr.pos) for sqr in self.squares)
+        body = self.virtual_body
 
         # Let the virtual snake check if path to apple is available
-        path_1 = v_snake.bfs(tuple(v_snake.head.pos), tuple(v_snake.apple.pos))
+        path_1 = self.apple_path()
 
         # This will be the path to virtual snake tail after it follows path_1
         path_2 = []
 
         if path_1:
-            for pos in path_1:
-                v_snake.go_to(pos)
-                v_snake.move()
-
-            v_snake.add_square()  # Because it will eat an apple
-            path_2 = v_snake.get_path_to_tail()
+            mark = body.mark()
+            for i, pos in enumerate(path_1):
+                body.move(cell_id(pos), grow=i == len(path_1) - 1)  # Because it will eat an apple
 
-        # v_snake.draw()
+            path_2 = body.path_to_tail()
+            body.rollback(mark)
 
-        if path_2:  # If there is a path between v_snake and it's tail
+        if path_2:  # If there is a path between virtual snake and it's tail
+            self.path_verified = True
             return path_1  # Choose BFS path to apple (Fastest and shortest path)
 
         # If path_1 or path_2 not available, test these 3 conditions:
             # 1- Make sure that the longest path to tail is available
             # 2- If score is even, choose longest_path_to_tail() to follow the tail, if odd use any_safe_move()
             # 3- Change the follow tail method if the snake gets stuck in a loop
-        if self.longest_path_to_tail() and\
-                self.score % 2 == 0 and\
-                self.moves_without_eating < MAX_MOVES_WITHOUT_EATING / 2:
+        # Each planner runs at most once per tick, so the path that was checked is also the one that is returned
+        if self.score % 2 == 0 and\
+                self.moves_without_eating < MAX_MOVES_WITHOUT_EATING / 2 and\
+                self.planned(self.longest_path_to_tail):
 
             # Choose longest path to tail
-            return self.longest_path_to_tail()
+            return self.planned(self.longest_path_to_tail)
 
         # Play any possible safe move and make sure path to tail is available
-        if self.any_safe_move():
-            return self.any_safe_move()
+        if self.planned(self.any_safe_move):
+            return self.planned(self.any_safe_move)
 
         # If path to tail is available
-        if self.get_path_to_tail():
+        if self.planned(self.get_path_to_tail):
             # Choose shortest path to tail
-            return self.get_path_to_tail()
+            return self.planned(self.get_path_to_tail)
 
         # Snake couldn't find a path and will probably die
         print('No available path, snake in danger!')
 
-    def update(self):
-        self.handle_events()
+    def summary(self):
+        return "score {}, {} moves, {:.1f} BFS runs per tick, {:.1f} planning calls per apple".format(
+            self.score, self.total_moves, self.bfs_runs / max(self.total_moves, 1),
+            self.planning_calls / max(self.score, 1))
+
+    def follow_cycle(self):  # Sets the direction of the next move in Hamiltonian mode, returns False if none is safe
+        head = cell_id(self.head.pos)
+        apple = cell_id(self.apple.pos)
+
+        # Once the whole body was laid down by moves along the cycle it lies on the cycle behind the head and the
+        # cells ahead are free
+        if self.cycle_moves >= len(self.squares):
+            return self.cycle_move(cycle_next(head, self.cycle_direction, apple), self.cycle_direction)
+
+        # Until then the snake moves along the cycle, in either direction since the body may already lie along it
+        # the other way round, if it can keep going until the body lies on the cycle. Otherwise it first steps to a
+        # neighbor from which it can, then makes any move along the cycle that leaves a way back to the tail, then
+        # moves away from the tail. Handing the move back to the apple planner would drag the body off the cycle
+        # again, so that only happens when no move leaves a way back to the tail
+        body = {cell_id(sqr.pos): i for i, sqr in enumerate(self.squares) if in_grid(sqr.pos)}
+        directions = (self.cycle_direction, 1 - self.cycle_direction)
+        for direction in directions:
+            next_cell = cycle_next(head, direction, apple)
+            if self.cycle_walk_clear(body, head, 0, direction, apple) and self.tail_reachable_after(next_cell):
+                return self.cycle_move(next_cell, direction)
+        for next_cell in NEIGHBORS[head]:
+            for direction in directions:
+                if self.cycle_walk_clear(body, next_cell, 1, direction, apple) and \
+                        self.tail_reachable_after(next_cell):
+                    self.cycle_moves = 0  # The walk along the cycle starts at next_cell
+                    return self.cycle_move(next_cell, direction)
+        for direction in directions:
+            next_cell = cycle_next(head, direction, apple)
+            if self.tail_reachable_after(next_cell):
+                return self.cycle_move(next_cell, direction)
+
+        self.cycle_moves = 0
+        tail = self.squares[-1].pos
+        safe_cells = [cell for cell in NEIGHBORS[head] if self.tail_reachable_after(cell)]
+        if not safe_cells:
+            return False
+        self.path = deque([max((CELL_POSITIONS[cell] for cell in safe_cells), key=lambda pos: distance(pos, tail))])
+        self.path_verified = False
+        self.go_to(self.path[0])
+        return True
+
+    def cycle_walk_clear(self, body, cell, moves, direction, apple):
+        # True if the head, at cell after moves moves, can walk along the cycle until the whole body lies on it:
+        # the tail must have left every cell of the body (body maps a cell to its index, head first) by the time
+        # the head gets there. The tail waits a move when the apple on the way is eaten
+        length = len(self.squares)
+        grown = 1 if cell == apple else 0
+        if moves and body.get(cell, length) < length - moves + grown:
+            return False
+        for moves in range(moves + 1, length + 1):
+            cell = cycle_next(cell, direction, apple)
+            if cell == apple:
+                grown += 1
+            if body.get(cell, length) < length - moves + grown:
+                return False
+        return True
+
+    def tail_reachable_after(self, cell):  # The head can move to cell and still reach the tail afterwards
+        apple = cell_id(self.apple.pos)
+        if cell not in self.free_cells and cell != cell_id(self.squares[-1].pos):
+            return False
+        body = VirtualBody(cell_id(sqr.pos) for sqr in self.squares)
+        body.move(cell, grow=cell == apple)
+        return bool(body.path_to_tail())
+
+    def cycle_move(self, next_cell, direction):  # Moves to next_cell as a move along the cycle in direction
+        if direction != self.cycle_direction:
+            self.cycle_moves = 0
+        self.cycle_direction = direction
+        self.cycle_moves += 1
+        self.path = deque([CELL_POSITIONS[next_cell]])
+        self.path_verified = False
+        self.go_to(self.path[0])
+        return True
+
+    def plan_move(self):
+        if len(self.squares) >= self.hamilton_coverage * ROWS * ROWS and self.follow_cycle():
+            return
 
-        self.path = self.set_path()
+        # Nothing but the snake moves until the apple is eaten, so a verified path to the apple stays safe and is
+        # followed without planning again as long as the head is where the path expects it
+        if self.path_verified and len(self.path) > 1 and tuple(self.head.pos) == self.path[0]:
+            self.path.popleft()
+        else:
+            bfs_calls = BFS.calls + self.distance_field.builds
+            self.path = deque(self.set_path() or [])
+            self.bfs_runs += BFS.calls + self.distance_field.builds - bfs_calls
+            self.planning_calls += 1
         if self.path:
             self.go_to(self.path[0])
 
-        self.draw()
+    def step(self):  # Moves the snake one square, returns 1 if the snake won the game
         self.move()
 
         if self.score == ROWS * ROWS - INITIAL_SNAKE_LENGTH:  # If snake wins the game
             self.won_game = True
 
-            print("Snake won the game after {} moves"
-                  .format(self.total_moves))
-
-            pygame.time.wait(1000 * WAIT_SECONDS_AFTER_WIN)
+            print("Snake won the game after {} moves ({})"
+                  .format(self.total_moves, self.summary()))
             return 1
 
         self.total_moves += 1
 
         if self.hitting_self() or self.head.hitting_wall():
-            print("Snake is dead, trying again..")
+            print("Snake is dead, trying again.. ({})".format(self.summary()))
             self.is_dead = True
             self.reset()
 
         if self.moves_without_eating == MAX_MOVES_WITHOUT_EATING:
             self.is_dead = True
-            print("Snake got stuck, trying again..")
+            print("Snake got stuck, trying again.. ({})".format(self.summary()))
             self.reset()
 
         if self.eating_apple():
             self.add_square()
+            self.generate_apple()  # After the snake has grown, so the apple never lands on the new tail
+
+    def update(self, renderer):
+        self.handle_events()
+        self.plan_move()
+        renderer.draw(self)
+
+        if self.step():
+            pygame.time.wait(1000 * WAIT_SECONDS_AFTER_WIN)
+            return 1
+
+
+class Renderer:
+    # Draws the snake onto the display surface. The screen color and grid are drawn once onto a background surface,
+    # after the first frame only the cells that changed since the last frame (new head, the square behind it, tail,
+    # apple) are redrawn and passed to pygame.display.update, so a frame costs the same for any snake length
+    def __init__(self, surface):
+        self.surface = surface
+        self.background = pygame.Surface(surface.get_size())
+        draw_screen(self.background)
+        draw_grid(self.background)
+        self.last_tail = None
+        self.last_moves = None  # total_moves of the snake when the last frame was drawn
+
+    def cell_rect(self, pos):  # A cell including the gaps around it that the squares next to it may cover
+        return pygame.Rect(pos[0] * SQUARE_SIZE - GAP_SIZE, pos[1] * SQUARE_SIZE - GAP_SIZE,
+                           SQUARE_SIZE + 2 * GAP_SIZE, SQUARE_SIZE + 2 * GAP_SIZE)
+
+    def draw(self, snake):
+        if self.last_moves is None or snake.total_moves != self.last_moves + 1:
+            # First frame or a new game, draw everything
+            self.surface.blit(self.background, (0, 0))
+            snake.draw()
+            pygame.display.update()
+        else:
+            # The old tail cell goes back to the background, which also clears the gap the new tail covered
+            # Whatever moved into that cell is one of the squares drawn below
+            rect = self.cell_rect(self.last_tail)
+            self.surface.blit(self.background, rect, rect)
+            rects = [rect]
+
+            snake.apple.draw(APPLE_CLR)
+            snake.head.draw(HEAD_CLR)
+            changed = [snake.squares[1], snake.squares[-2], snake.squares[-1]]  # Old head, and tail after growing
+            for sqr in changed:
+                sqr.draw()
+            rects += [self.cell_rect(sqr.pos) for sqr in [snake.apple, snake.head] + changed]
+            pygame.display.update(rects)
+
+        self.last_tail = snake.squares[-1].pos[:]
+        self.last_moves = snake.total_moves
+
 
 def draw_screen(surface):
     surface.fill(SURFACE_CLR)
@@ -446,15 +766,262 @@ def play_game():
     game_surface = pygame.display.set_mode((WIDTH, HEIGHT))
     clock = pygame.time.Clock()
     snake = Snake(game_surface)
+    renderer = Renderer(game_surface)
 
     mainloop = True
     while mainloop:
-        draw_screen(game_surface)
-        draw_grid(game_surface)
-
-        snake.update()
+        snake.update(renderer)
         clock.tick(FPS)
-        pygame.display.update()
+
+
+class BFSPolicy:
+    # The planner of Snake.set_path as a policy for the shared game core (snake_core.SnakeCore) on a square board
+    # The BFS path to the apple is followed when the snake can still reach its tail after eating, otherwise the
+    # snake moves to the free neighbor farthest from its tail that keeps the tail reachable
+    def reset(self, game):
+        self.bfs = BFS if game.rows == ROWS else GridBFS(game.rows)
+        self.field = DistanceField(self.bfs.neighbors)
+        self.board = Bitboard(game.rows, game.cols)
+        self.tail = game.tail
+        self.path = deque()
+
+    def snapshot(self):  # The path being followed and the distance field, for checkpoints
+        field = self.field
+        state = array('i', [len(self.path), field.food, field.stale, self.tail]) + array('i', self.path)
+        return (state + field.dist).tobytes() + field.body
+
+    def restore(self, game, data):
+        self.reset(game)
+        cells = len(self.field.body)
+        state = array('i')
+        state.frombytes(data[:-cells])
+        path_length, self.field.food, stale, self.tail = state[:4]
+        self.field.stale = bool(stale)
+        self.path.extend(state[4:4 + path_length])
+        self.field.dist[:] = state[4 + path_length:]
+        self.field.body[:] = data[-cells:]
+
+    def act(self, game):
+        # Tells the distance field what the body did since the last tick
+        self.field.block(game.head)
+        if self.tail != game.tail and game.grid[self.tail] != BODY:
+            self.field.free(self.tail)
+        self.tail = game.tail
+        if not self.path:
+            self.set_path(game)
+        return game.next_cell[game.head].index(self.path.popleft())
+
+    def set_path(self, game):
+        body = VirtualBody(game.body_cells(), self.bfs)
+        cells = body.cells
+
+        path_1 = self.field.path(game.head, game.food, cells)
+        if path_1:
+            mark = body.mark()
+            for i, cell in enumerate(path_1):
+                body.move(cell, grow=i == len(path_1) - 1)  # Because it will eat an apple
+            path_2 = body.path_to_tail()
+            body.rollback(mark)
+            if path_2:
+                self.path.extend(path_1)
+                return
+
+        neighbors = [n for n in game.next_cell[game.head] if n >= 0 and game.grid[n] != BODY and n != game.food]
+        if len(cells) > 2:
+            free = self.board.from_grid(game.grid) | 1 << cells[-1]
+            safe_cells = self.board.flood_fill(1 << cells[-2], free)
+            tail = game.position(game.tail)
+            safe_neighbors = [n for n in neighbors if safe_cells >> n & 1]
+            if safe_neighbors:
+                self.path.append(max(safe_neighbors, key=lambda n: distance(game.position(n), tail)))
+                return
+            path_to_tail = body.path_to_tail()
+            if path_to_tail:
+                self.path.append(path_to_tail[0])
+                return
+
+        if neighbors:
+            self.path.append(neighbors[0])
+        else:  # No free neighbor, keep going until the snake dies
+            self.path.append(game.next_cell[game.head][game.direction])
+
+
+# Searches between random free cells of a rows x rows grid where a third of the cells are blocked, with the BFS
+# backend that was selected
+def benchmark_bfs(rows_list=(17, 100), seconds=2.0):
+    for rows in rows_list:
+        rng = Random(0)
+        bfs = type(BFS)(rows)
+        cells = list(range(rows * rows))
+        blocked = rng.sample(cells, rows * rows // 3)
+        free = list(set(cells) - set(blocked))
+        pairs = [(rng.choice(free), rng.choice(free)) for _ in range(1000)]
+
+        calls = found = 0
+        start_time = time.perf_counter()
+        while time.perf_counter() - start_time < seconds:
+            s, e = pairs[calls % len(pairs)]
+            if bfs.search(s, e, blocked):
+                found += 1
+            calls += 1
+        elapsed = time.perf_counter() - start_time
+        print('{0}x{0}: {1:.0f} BFS calls/sec ({2} of {3} paths found)'.format(rows, calls / elapsed, found, calls))
+
+
+# Plays a seeded game without drawing and reports the planner work per tick
+def benchmark_planner(ticks=3000):
+    seed(0)
+    snake = Snake(None)
+    start_time = time.perf_counter()
+    for _ in range(ticks):
+        snake.plan_move()
+        if snake.step():
+            break
+    elapsed = time.perf_counter() - start_time
+    print('{} ticks, {:.2f} ms per tick, {:.2f} BFS runs per tick, {:.1f} planning calls per apple, score {}'.format(
+        ticks, 1000 * elapsed / ticks, (BFS.calls + snake.distance_field.builds) / ticks,
+        snake.planning_calls / max(snake.score, 1), snake.score))
+
+
+# A snake that covers the given share of the board, laid out along the Hamiltonian cycle
+# The free cells form one corridor from the head back to the tail, like in a real late game
+def late_game_snake(coverage=0.8, surface=None):
+    length = int(coverage * ROWS * ROWS) + 1
+    body = HAMILTON_CYCLE[:length][::-1]
+
+    snake = Snake(surface)
+    snake.squares = [Square(list(pos), surface) for pos in body]
+    snake.turns = {}
+    for i in range(1, length):
+        # Each square leaves its cell towards the square ahead of it and its dir is the way it came in
+        snake.turns[tuple(body[i])] = [body[i - 1][0] - body[i][0], body[i - 1][1] - body[i][1]]
+        if i + 1 < length:
+            snake.squares[i].dir = [body[i][0] - body[i + 1][0], body[i][1] - body[i + 1][1]]
+        else:
+            snake.squares[i].dir = snake.turns[tuple(body[i])]
+    snake.head = snake.squares[0]
+    snake.head.dir = [body[0][0] - body[1][0], body[0][1] - body[1][1]]
+    snake.dir = snake.head.dir
+    snake.tail = snake.squares[-1]
+    snake.tail.is_tail = True
+    snake.score = length - INITIAL_SNAKE_LENGTH
+    snake.rebuild_free_cells()
+    snake.generate_apple()
+    return snake
+
+
+# Ticks per second of a snake that covers more than 80% of the board, planning with BFS like before it would switch
+# to the Hamiltonian cycle
+def benchmark_late_game(ticks=300):
+    seed(0)
+    snake = late_game_snake(0.8)
+    snake.hamilton_coverage = 2.0
+    start_length = len(snake.squares)
+    start_time = time.perf_counter()
+    for tick in range(ticks):
+        snake.plan_move()
+        if snake.step() or len(snake.squares) < start_length:  # Snake won or died and was reset
+            break
+    elapsed = time.perf_counter() - start_time
+    print('{}x{} board, snake length {}: {:.0f} ticks/sec over {} ticks, {} planning calls, final length {}'.format(
+        ROWS, ROWS, start_length, (tick + 1) / elapsed, tick + 1, snake.planning_calls, len(snake.squares)))
+
+
+# Tail reachability of every head neighbor, one simulated move and BFS per neighbor against a single flood fill
+def benchmark_reachability(repeats=2000):
+    seed(0)
+    for coverage in (0.8, 0.9):
+        snake = late_game_snake(coverage)
+        snake.virtual_body = VirtualBody(cell_id(sqr.pos) for sqr in snake.squares)
+        body = snake.virtual_body
+        neighbors = [cell_id(n) for n in get_neighbors(snake.head.pos) if snake.is_position_free(n)]
+
+        start_time = time.perf_counter()
+        for _ in range(repeats):
+            for n in neighbors:
+                mark = body.mark()
+                body.move(n)
+                body.path_to_tail()
+                body.rollback(mark)
+        per_move = (time.perf_counter() - start_time) / repeats
+
+        start_time = time.perf_counter()
+        for _ in range(repeats):
+            snake.tail_reachable_cells()
+        flood_fill = (time.perf_counter() - start_time) / repeats
+
+        print('{:.0%} covered, {} moves: {:.1f} us with a BFS per move, {:.1f} us with one flood fill'.format(
+            coverage, len(neighbors), 1e6 * per_move, 1e6 * flood_fill))
+
+
+# Frame time of a full redraw against the Renderer for a short and a long snake
+def benchmark_render(frames=300):
+    environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    pygame.init()
+    surface = pygame.display.set_mode((WIDTH, HEIGHT))
+
+    for coverage in (0.1, 0.8):
+        for method in ('full redraw', 'renderer'):
+            seed(0)
+            snake = late_game_snake(coverage, surface)
+            renderer = Renderer(surface)
+            frame_time = 0
+            for _ in range(frames):
+                snake.plan_move()
+                start_time = time.perf_counter()
+                if method == 'renderer':
+                    renderer.draw(snake)
+                else:
+                    draw_screen(surface)
+                    draw_grid(surface)
+                    snake.draw()
+                    pygame.display.update()
+                frame_time += time.perf_counter() - start_time
+                snake.step()
+            print('snake length {:3}, {:11}: {:.3f} ms per frame'.format(
+                int(coverage * ROWS * ROWS) + 1, method, 1000 * frame_time / frames))
+    pygame.quit()
+
+
+def moves_to_win(game, coverage=HAMILTON_COVERAGE, max_moves=200000):  # None if the seeded game isn't won
+    seed(game)
+    snake = Snake(None)
+    snake.hamilton_coverage = coverage
+    for _ in range(max_moves):
+        snake.plan_move()
+        if snake.step():
+            return snake.total_moves
+        if snake.total_moves == 0:  # Snake died or got stuck and the game was reset
+            return None
+
+
+# Win rate and moves to win of seeded games with and without switching to the Hamiltonian cycle
+def benchmark_endgame(games=10, max_moves=200000):
+    for name, coverage in (('BFS only', 2.0), ('Hamiltonian from {:.0%}'.format(HAMILTON_COVERAGE), HAMILTON_COVERAGE)):
+        start_time = time.perf_counter()
+        wins = [moves for moves in (moves_to_win(game, coverage, max_moves) for game in range(games))
+                if moves is not None]
+        print('{}: won {} of {} games, {} moves to win on average, {:.1f} s'.format(
+            name, len(wins), games, sum(wins) // len(wins) if wins else '-', time.perf_counter() - start_time))
+
+
+BENCHMARKS = {'bfs': benchmark_bfs, 'planner': benchmark_planner, 'late-game': benchmark_late_game,
+              'reachability': benchmark_reachability, 'render': benchmark_render,
+              'endgame': benchmark_endgame}
 
 if __name__ == '__main__':
-    play_game()
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--benchmark', choices=sorted(BENCHMARKS))
+    parser.add_argument('--seed', type=int, help='Seed for the apple positions and the random moves of the snake')
+    parser.add_argument('--numpy-bfs', action='store_true',
+                        help='Search with the NumPy frontier BFS, faster than GridBFS from about 100x100')
+    args = parser.parse_args()
+    if args.seed is not None:
+        seed(args.seed)
+    if args.numpy_bfs:
+        BFS = FrontierBFS(ROWS)
+
+    if args.benchmark:
+        BENCHMARKS[args.benchmark]()
+    else:
+        play_game()
\ No newline at end of file
@@ -0,0 +1,120 @@
+import argparse
+import os
+import signal
+import struct
+import time
+import zlib
+
+from snake_core import SnakeCore
+from benchmark import SOLVERS, load_policy, new_game
+
+# Long headless runs on the shared game core that save a checkpoint every few moves and can resume from it
+# A resumed run plays exactly the same moves as a run that was never stopped
+# Run with: python checkpoint.py SOLVER [--size ROWS] [--seed N] [--every MOVES] [--checkpoint FILE] [--resume]
+# Only solvers whose policy has snapshot() and restore() can be checkpointed (hamilton, breadth-first)
+
+MAGIC = b'SNKP'
+VERSION = 3  # 2: breadth-first checkpoints hold its distance field, 3: and the body cells the field knows
+HEADER = struct.Struct('<4sBQB')  # magic, version, seed, length of the solver name
+SECTION = struct.Struct('<I')  # Length of the snapshot that follows
+
+
+def save_checkpoint(path, solver, seed, game, policy):
+    # Written to a temporary file first and renamed over the old checkpoint, so a crash while saving leaves the
+    # previous checkpoint in place
+    name = solver.encode()
+    game_state = game.snapshot()
+    policy_state = policy.snapshot()
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, seed, len(name)) + name)
+        f.write(SECTION.pack(len(game_state)) + game_state)
+        f.write(SECTION.pack(len(policy_state)) + policy_state)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+def load_checkpoint(path):  # Returns solver, seed, game and policy
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, version, seed, name_length = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('%s is not a checkpoint file' % path)
+    offset = HEADER.size
+    solver = data[offset:offset + name_length].decode()
+    offset += name_length
+    sections = []
+    for _ in range(2):
+        size, = SECTION.unpack_from(data, offset)
+        offset += SECTION.size
+        sections.append(data[offset:offset + size])
+        offset += size
+
+    game_state, policy_state = sections
+    rows, cols, wrap = struct.unpack_from('<HHB', game_state)
+    game = SnakeCore(rows, cols, wrap=bool(wrap), seed=seed)
+    game.restore(game_state)
+    policy = load_policy(solver)()
+    policy.restore(game, policy_state)
+    return solver, seed, game, policy
+
+
+def new_run(solver, seed, rows):
+    game, policy = new_game(load_policy(solver), rows, seed)
+    if not hasattr(policy, 'snapshot'):
+        raise SystemExit('%s can not be checkpointed' % solver)
+    policy.reset(game)
+    return game, policy
+
+
+def run(path, solver, seed, game, policy, every):
+    # Plays until the game ends or the run is interrupted, SIGINT and SIGTERM are only acted on between moves so
+    # the checkpoint written on the way out is consistent
+    stop = []
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signal_number, lambda *args: stop.append(True))
+
+    max_steps_without_food = 4 * game.size
+    start = time.perf_counter()
+    start_steps = game.steps
+    # A checkpoint of a run that already ended is resumed without playing another move
+    over = not game.alive or game.won or game.steps_since_food > max_steps_without_food
+    while not stop and not over:
+        running = game.step(policy.act(game))
+        if not running or game.steps_since_food > max_steps_without_food:
+            break
+        if game.steps % every == 0:
+            save_checkpoint(path, solver, seed, game, policy)
+    save_checkpoint(path, solver, seed, game, policy)
+
+    elapsed = time.perf_counter() - start
+    state = 'interrupted' if stop else 'won' if game.won else 'died' if not game.alive else 'stuck'
+    print('%s seed %d on %dx%d: %s, score %d after %d moves (%d in %.1f s), state crc %08x' % (
+        solver, seed, game.rows, game.cols, state, game.score, game.steps, game.steps - start_steps, elapsed,
+        zlib.crc32(game.snapshot())))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Checkpointed runs of the solvers on the shared game core')
+    parser.add_argument('solver', choices=sorted(SOLVERS))
+    parser.add_argument('--size', type=int, default=40)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--every', type=int, default=100000, help='moves between checkpoints')
+    parser.add_argument('--checkpoint', default=None, help='file, SOLVER-SEED.checkpoint by default')
+    parser.add_argument('--resume', action='store_true', help='continue from the checkpoint file')
+    args = parser.parse_args()
+    path = args.checkpoint or '%s-%d.checkpoint' % (args.solver, args.seed)
+
+    if args.resume:
+        solver, seed, game, policy = load_checkpoint(path)
+        if solver != args.solver:
+            parser.error('%s is a checkpoint of %s' % (path, solver))
+    else:
+        seed = args.seed
+        game, policy = new_run(args.solver, seed, args.size)
+    run(path, args.solver, seed, game, policy, args.every)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+import argparse
+import time
+from random import Random
+
+import numpy as np
+
+# Breadth first search that expands the whole frontier at once with NumPy arrays, for very large boards
+# Cells are numbered row by row like snake_core, the cell of (r, c) is r * cols + c. The board is kept as a boolean
+# array of open cells with a closed border around it, and the frontier as an array of positions in it. A level
+# shifts the frontier by the offset of each direction, keeps the positions that are still open, closes them and
+# writes the direction they were entered in to an int8 array; the path is then walked back along those directions.
+# A level costs a few array operations on the frontier, so the search only beats the cell by cell GridBFS of
+# breadth first.py once boards are large and levels hold many cells, see the crossover benchmark
+# Benchmark with: python frontier_bfs.py [--sizes 20 50 100 200 300 500] [--seconds S]
+
+
+class FrontierBFS:
+    def __init__(self, rows, cols=None):
+        cols = rows if cols is None else cols
+        self.rows = rows
+        self.cols = cols
+        self.width = cols + 2  # Row length of the arrays, which have a border of closed cells around the board
+        # Offset of each direction in the arrays, in the order GridBFS tries them: down, up, right, left
+        self.offsets = (self.width, -self.width, 1, -1)
+        self.open = np.zeros((rows + 2) * self.width, dtype=bool)
+        self.board = self.open.reshape(rows + 2, self.width)[1:-1, 1:-1]  # The open cells of the board itself
+        self.parent = np.zeros((rows + 2) * self.width, dtype=np.int8)  # Direction each cell was entered in
+        self.calls = 0
+
+    def position(self, cell):  # Position of a cell id in the arrays
+        r, c = divmod(cell, self.cols)
+        return (r + 1) * self.width + c + 1
+
+    def cell(self, position):
+        r, c = divmod(position, self.width)
+        return (r - 1) * self.cols + c - 1
+
+    def expand(self, start, end, blocked):
+        # Runs levels until end is reached (never when end is -1) or no cell is left, returns the positions reached
+        # by each level, None when end is blocked
+        self.calls += 1
+        is_open, parent, offsets = self.open, self.parent, self.offsets
+        self.board.fill(True)
+        blocked_r, blocked_c = np.divmod(np.fromiter(blocked, dtype=np.intp), self.cols)
+        self.board[blocked_r, blocked_c] = False
+        start = self.position(start)
+        end = self.position(end) if end >= 0 else -1
+        if end >= 0 and not is_open[end]:
+            return None
+        is_open[start] = False
+        frontier = np.array([start], dtype=np.intp)
+        levels = [frontier]
+        while len(frontier):
+            reached = []
+            for direction, offset in enumerate(offsets):
+                cells = frontier + offset
+                cells = cells[is_open[cells]]
+                is_open[cells] = False
+                parent[cells] = direction
+                reached.append(cells)
+            frontier = np.concatenate(reached)
+            levels.append(frontier)
+            if end >= 0 and not is_open[end]:
+                break
+        return levels
+
+    def search(self, start, end, blocked):  # Shortest path from start to end (start excluded), [] if there is none
+        if end == start:
+            return []
+        if self.expand(start, end, blocked) is None or self.open[self.position(end)]:
+            return []
+        position, start = self.position(end), self.position(start)
+        parent, offsets = self.parent, self.offsets
+        path = []
+        while position != start:
+            path.append(self.cell(position))
+            position -= offsets[parent[position]]
+        path.reverse()
+        return path
+
+    def flood_fill(self, start, blocked):  # Set of cells reachable from start without entering blocked cells
+        return {self.cell(position) for position in np.concatenate(self.expand(start, -1, blocked)).tolist()}
+
+
+# Searches between random free cells of boards where a third of the cells are blocked, the frontier BFS against
+# GridBFS.search of breadth first.py, and the board size from which the frontier BFS is faster
+def benchmark_crossover(sizes=(20, 50, 100, 200, 300, 500), seconds=1.0):
+    from benchmark import load_script
+    grid_bfs = load_script('breadth first.py').GridBFS
+    crossover = None
+    for rows in sizes:
+        rng = Random(0)
+        cells = list(range(rows * rows))
+        blocked = rng.sample(cells, rows * rows // 3)
+        free = list(set(cells) - set(blocked))
+        pairs = [(rng.choice(free), rng.choice(free)) for _ in range(200)]
+        times = []
+        lengths = []
+        for bfs in (grid_bfs(rows), FrontierBFS(rows)):
+            calls = 0
+            path_lengths = []
+            start_time = time.perf_counter()
+            while time.perf_counter() - start_time < seconds or calls < 3:
+                s, e = pairs[calls % len(pairs)]
+                path_lengths.append(len(bfs.search(s, e, blocked)))
+                calls += 1
+            times.append((time.perf_counter() - start_time) / calls)
+            lengths.append(path_lengths)
+        calls = min(len(lengths[0]), len(lengths[1]))
+        assert lengths[0][:calls] == lengths[1][:calls], 'path lengths differ'
+        if crossover is None and times[1] < times[0]:
+            crossover = rows
+        print('{0}x{0}: GridBFS {1:9.2f} ms, frontier BFS {2:9.2f} ms per search, same path lengths in {3} '
+              'searches'.format(rows, 1000 * times[0], 1000 * times[1], calls))
+    print('frontier BFS is faster from {0}x{0}'.format(crossover) if crossover else 'GridBFS is faster on every size')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Frontier BFS on NumPy arrays against the cell by cell BFS')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[20, 50, 100, 200, 300, 500])
+    parser.add_argument('--seconds', type=float, default=1.0, help='time spent on each measurement')
+    args = parser.parse_args()
+    benchmark_crossover(args.sizes, args.seconds)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,10 @@
 import pygame as pg
 import sys
-from random import randint
+from random import randint, seed
 import time
 import os
 from collections import deque
+from array import array
 
 # Used to modify the window size, values must be a multiple of 40
 screen_width = 400
@@ -554,10 +555,53 @@ def path_generator(graph, cells):
     return path
 
 
-circuit = prim_maze_generator(int(screen_height / 40), int(screen_width / 40))
-pg.init()
-window = pg.display.set_mode((screen_width, screen_height))
-pg.display.set_caption('Snake Solver')
-fruit = Fruit()
-snake = Snake()
-gameplay(fruit, snake, circuit)
\ No newline at end of file
+# Follows a hamiltonian cycle like gameplay, as a policy for the shared game core (snake_core.SnakeCore)
+# The core needs an even number of rows and columns, and the snake starts as a single cell like the game here
+class HamiltonPolicy(object):
+
+    start_length = 1
+
+    def reset(self, game):
+
+        # The cycle is made of (x, y) positions, x runs along the columns of the core and y along its rows
+        cycle = prim_maze_generator(game.rows // 2, game.cols // 2)
+        self.next_on_cycle = [-1] * game.size
+        for index, (x, y) in enumerate(cycle):
+            next_x, next_y = cycle[(index + 1) % len(cycle)]
+            self.next_on_cycle[game.cell(y, x)] = game.cell(next_y, next_x)
+
+    # The cycle as bytes for checkpoints, the maze is random so it can't be generated again on resume
+    def snapshot(self):
+
+        return array('i', self.next_on_cycle).tobytes()
+
+    def restore(self, game, data):
+
+        cycle = array('i')
+        cycle.frombytes(data)
+        self.next_on_cycle = cycle.tolist()
+
+    # The direction that takes the head to the next position of the cycle
+    def act(self, game):
+
+        return game.next_cell[game.head].index(self.next_on_cycle[game.head])
+
+
+def main():
+    global window, snake
+
+    circuit = prim_maze_generator(int(screen_height / 40), int(screen_width / 40))
+    pg.init()
+    window = pg.display.set_mode((screen_width, screen_height))
+    pg.display.set_caption('Snake Solver')
+    fruit = Fruit()
+    snake = Snake()
+    gameplay(fruit, snake, circuit)
+
+
+if __name__ == '__main__':
+
+    # --seed N makes the maze and the fruit positions repeat from run to run
+    if '--seed' in sys.argv:
+        seed(int(sys.argv[sys.argv.index('--seed') + 1]))
+    main()
\ No newline at end of file
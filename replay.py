@@ -0,0 +1,182 @@
+import argparse
+import os
+import random
+import struct
+import time
+
+from snake_core import SnakeCore, play
+from benchmark import SOLVERS, load_policy, new_game
+
+# Compact binary replays of games on the shared game core
+# Layout: header, then the moves packed 2 bits each (4 per byte, first move in the lowest bits), then the food
+# positions (cell ids, the first food of the game followed by the food placed after every apple)
+# Record with: python replay.py record SOLVER [--seed N] [--size ROWS] [-o FILE]
+# Play with:   python replay.py play FILE [--render FIRST:LAST] [--fps N]
+
+MAGIC = b'SNKR'
+VERSION = 1
+# magic, version, rows, cols, wrap, start length, seed, move count, food count, length of the solver name
+HEADER = struct.Struct('<4sBHHBBQII B')
+WRITE_BUFFER = 1 << 16  # Packed moves are written to the file in blocks of this many bytes
+
+# UNPACKED[byte] = the 4 moves packed into that byte
+UNPACKED = [(b & 3, b >> 2 & 3, b >> 4 & 3, b >> 6) for b in range(256)]
+
+
+class ReplayWriter:
+    # Records a game move by move, open it before the first move and close it after the last one
+    def __init__(self, path, game, seed, solver):
+        self.file = open(path, 'wb')
+        self.game = game
+        self.seed = seed
+        self.solver = solver.encode()
+        self.moves = 0
+        self.packed = bytearray()
+        self.byte = 0
+        self.foods = [game.food]
+        self.file.write(self.header())  # Move and food counts are filled in by close()
+        self.file.write(self.solver)
+
+    def header(self):
+        game = self.game
+        return HEADER.pack(MAGIC, VERSION, game.rows, game.cols, game.wrap, game.start_length, self.seed,
+                           self.moves, len(self.foods), len(self.solver))
+
+    def record(self, move):  # Move the game made (game.direction after game.step)
+        self.byte |= move << 2 * (self.moves & 3)
+        self.moves += 1
+        if self.moves & 3 == 0:
+            self.packed.append(self.byte)
+            self.byte = 0
+            if len(self.packed) >= WRITE_BUFFER:
+                self.file.write(self.packed)
+                self.packed = bytearray()
+        if self.game.food != self.foods[-1] and self.game.food >= 0:
+            self.foods.append(self.game.food)
+
+    def close(self):
+        if self.moves & 3:
+            self.packed.append(self.byte)
+        self.file.write(self.packed)
+        self.file.write(struct.pack('<%dI' % len(self.foods), *self.foods))
+        self.file.seek(0)
+        self.file.write(self.header())
+        self.file.close()
+
+
+class Replay:
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        (magic, version, self.rows, self.cols, wrap, self.start_length, self.seed, self.move_count, food_count,
+         name_length) = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('%s is not a replay file' % path)
+        self.wrap = bool(wrap)
+        offset = HEADER.size
+        self.solver = data[offset:offset + name_length].decode()
+        offset += name_length
+        packed_size = (self.move_count + 3) // 4
+        self.packed = data[offset:offset + packed_size]
+        offset += packed_size
+        self.foods = struct.unpack_from('<%dI' % food_count, data, offset)
+
+    def new_game(self):
+        return SnakeCore(self.rows, self.cols, wrap=self.wrap, start_length=self.start_length, seed=self.seed)
+
+    def moves(self):
+        count = 0
+        for byte in self.packed:
+            for move in UNPACKED[byte]:
+                if count == self.move_count:
+                    return
+                count += 1
+                yield move
+
+    def play(self, game, first=0, last=None, on_step=None):
+        # Re-simulates the game, calling on_step(game) after every move from first to last, and checks that the
+        # food shows up where it was recorded
+        food = 0
+        if game.food != self.foods[0]:
+            raise ValueError('replay diverged before the first move')
+        for number, move in enumerate(self.moves()):
+            if last is not None and number >= last:
+                break
+            score = game.score
+            game.step(move)
+            if game.score != score and game.food >= 0:
+                food += 1
+                if food >= len(self.foods) or game.food != self.foods[food]:
+                    raise ValueError('replay diverged at move %d' % number)
+            if on_step and number >= first:
+                on_step(game)
+        return game
+
+
+def record(solver, seed, rows, path):
+    game, policy = new_game(load_policy(solver), rows, seed)
+    writer = ReplayWriter(path, game, seed, solver)
+
+    start = time.perf_counter()
+    play(game, policy, on_step=lambda game: writer.record(game.direction))
+    writer.close()
+    print('%s seed %d: score %d, %d moves, %s in %.2f s, %d bytes' % (
+        solver, seed, game.score, game.steps, 'won' if game.won else 'died' if not game.alive else 'stuck',
+        time.perf_counter() - start, os.path.getsize(path)))
+
+
+def render(replay, first, last, fps):
+    import pygame
+    from viewer import draw_grid
+    square = max(4, min(30, 600 // max(replay.rows, replay.cols)))
+    pygame.init()
+    surface = pygame.display.set_mode((replay.cols * square, replay.rows * square))
+    pygame.display.set_caption('Replay: %s seed %d' % (replay.solver, replay.seed))
+    clock = pygame.time.Clock()
+
+    def draw(game):
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                raise SystemExit
+        draw_grid(surface, game.grid, game.cols, game.head, square)
+        pygame.display.update()
+        clock.tick(fps)
+
+    replay.play(replay.new_game(), first, last, draw)
+    pygame.quit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Record and play replays of the solvers on the shared game core')
+    commands = parser.add_subparsers(dest='command', required=True)
+    record_parser = commands.add_parser('record')
+    record_parser.add_argument('solver', choices=sorted(SOLVERS))
+    record_parser.add_argument('--seed', type=int, default=None, help='random seed when not given')
+    record_parser.add_argument('--size', type=int, default=20)
+    record_parser.add_argument('-o', '--output', default=None)
+    play_parser = commands.add_parser('play')
+    play_parser.add_argument('file')
+    play_parser.add_argument('--render', metavar='FIRST:LAST', help='draw the moves in this range')
+    play_parser.add_argument('--fps', type=int, default=30)
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        seed = random.randrange(1 << 32) if args.seed is None else args.seed
+        record(args.solver, seed, args.size, args.output or '%s-%d.replay' % (args.solver, seed))
+        return
+
+    replay = Replay(args.file)
+    if args.render:
+        first, last = args.render.split(':')
+        render(replay, int(first or 0), int(last) if last else None, args.fps)
+        return
+    start = time.perf_counter()
+    game = replay.play(replay.new_game())
+    elapsed = time.perf_counter() - start
+    print('%s seed %d on %dx%d: score %d after %d moves, replayed in %.2f s (%.0f moves/sec)' % (
+        replay.solver, replay.seed, replay.rows, replay.cols, game.score, game.steps, elapsed,
+        game.steps / elapsed if elapsed else 0))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,339 @@
+import random
+import struct
+from array import array
+
+# Display-free snake game shared by all solvers
+# Cells are numbered row by row, the cell of position (r, c) is r * cols + c
+# Solvers plug in as policies: objects with an act(game) method that returns the index of a direction in DIRECTIONS.
+# They read the game directly: rows, cols, wrap, grid, next_cell, head, tail, food, length and direction, and
+# body_cells() and position() when they need the whole body or a cell as (r, c)
+
+DIRECTIONS = ((-1, 0), (1, 0), (0, -1), (0, 1))  # up, down, left, right as (row, column) steps
+OPPOSITE = (1, 0, 3, 2)
+
+# rows, cols, wrap, start length, direction, alive, won, score, steps, steps since food, food, length, free cells
+SNAPSHOT_HEADER = struct.Struct('<HHBBBBBIQQiII')
+
+# Contents of a grid cell
+EMPTY = 0
+BODY = 1
+FOOD = 2
+
+
+class SnakeCore:
+
+    def __init__(self, rows, cols, wrap=False, start_length=3, seed=None):
+        self.rows = rows
+        self.cols = cols
+        self.size = rows * cols
+        self.wrap = wrap  # Snake leaves the board on one side and enters on the other instead of dying
+        self.start_length = start_length
+        self.rng = random.Random(seed)
+
+        # next_cell[cell][direction] is the cell reached by moving in that direction, -1 for a wall
+        self.next_cell = []
+        for r in range(rows):
+            for c in range(cols):
+                cells = []
+                for dr, dc in DIRECTIONS:
+                    nr, nc = r + dr, c + dc
+                    if wrap:
+                        cells.append((nr % rows) * cols + nc % cols)
+                    elif 0 <= nr < rows and 0 <= nc < cols:
+                        cells.append(nr * cols + nc)
+                    else:
+                        cells.append(-1)
+                self.next_cell.append(cells)
+
+        self.reset()
+
+    def reset(self):
+        self.grid = bytearray(self.size)
+
+        # The body is a ring buffer, body[head_index] is the head and the following length - 1 cells (going
+        # backwards around the buffer) are the rest of the body down to the tail
+        self.body = [0] * self.size
+        self.head_index = 0
+        self.length = 0
+
+        # Free cells in a list together with the index of each cell in it, so cells are added, removed and drawn
+        # at random in O(1)
+        self.free = list(range(self.size))
+        self.free_index = list(range(self.size))
+
+        self.direction = 0
+        self.score = 0
+        self.steps = 0
+        self.steps_since_food = 0
+        self.alive = True
+        self.won = False
+
+        # The snake starts in the middle of the board, heading up with its body below the head
+        head = (self.rows // 2) * self.cols + self.cols // 2
+        cells = [head]
+        for _ in range(self.start_length - 1):
+            below = self.next_cell[cells[-1]][1]
+            if below < 0 or below in cells:
+                break
+            cells.append(below)
+        for cell in reversed(cells):
+            self.push_head(cell)
+
+        self.food = -1
+        self.spawn_food()
+
+    def push_head(self, cell):
+        self.head_index = (self.head_index + 1) % self.size
+        self.body[self.head_index] = cell
+        self.length += 1
+        self.grid[cell] = BODY
+        self.take_free(cell)
+
+    def pop_tail(self):
+        cell = self.body[(self.head_index - self.length + 1) % self.size]
+        self.length -= 1
+        self.grid[cell] = EMPTY
+        self.add_free(cell)
+        return cell
+
+    def take_free(self, cell):
+        i = self.free_index[cell]
+        if i >= 0:
+            last = self.free.pop()  # The last free cell takes the place of the removed one
+            if last != cell:
+                self.free[i] = last
+                self.free_index[last] = i
+            self.free_index[cell] = -1
+
+    def add_free(self, cell):
+        if self.free_index[cell] < 0:
+            self.free_index[cell] = len(self.free)
+            self.free.append(cell)
+
+    def spawn_food(self):  # Places the food on a random free cell in one draw, the game is won if there is none
+        if not self.free:
+            self.food = -1
+            self.won = True
+            return
+        self.food = self.free[self.rng.randrange(len(self.free))]
+        self.grid[self.food] = FOOD
+
+    @property
+    def head(self):
+        return self.body[self.head_index]
+
+    @property
+    def tail(self):
+        return self.body[(self.head_index - self.length + 1) % self.size]
+
+    def body_cells(self):  # Cells of the snake from head to tail
+        for i in range(self.length):
+            yield self.body[(self.head_index - i) % self.size]
+
+    def position(self, cell):
+        return divmod(cell, self.cols)
+
+    def cell(self, r, c):
+        return r * self.cols + c
+
+    def cell_array(self, cells=()):  # Cell ids take 2 bytes each in snapshots of boards up to 65536 cells
+        return array('H' if self.size <= 1 << 16 else 'I', cells)
+
+    def snapshot(self):  # The whole game state as bytes, restore() continues the game exactly where it was
+        rng_state = self.rng.getstate()
+        return b''.join((
+            SNAPSHOT_HEADER.pack(self.rows, self.cols, self.wrap, self.start_length, self.direction, self.alive,
+                                 self.won, self.score, self.steps, self.steps_since_food, self.food, self.length,
+                                 len(self.free)),
+            self.cell_array(reversed(list(self.body_cells()))).tobytes(),  # Tail first
+            self.cell_array(self.free).tobytes(),  # The order of the free cells decides where the next food goes
+            array('I', rng_state[1]).tobytes()))
+
+    def restore(self, data):
+        (rows, cols, wrap, self.start_length, self.direction, alive, won, self.score, self.steps,
+         self.steps_since_food, food, length, free_count) = SNAPSHOT_HEADER.unpack_from(data)
+        if (rows, cols, wrap) != (self.rows, self.cols, self.wrap):
+            raise ValueError('snapshot of a %dx%d board does not fit this %dx%d board' % (rows, cols, self.rows,
+                                                                                          self.cols))
+        offset = SNAPSHOT_HEADER.size
+        body = self.cell_array()
+        body.frombytes(data[offset:offset + length * body.itemsize])
+        offset += length * body.itemsize
+        free = self.cell_array()
+        free.frombytes(data[offset:offset + free_count * free.itemsize])
+        offset += free_count * free.itemsize
+        rng_state = array('I')
+        rng_state.frombytes(data[offset:])
+
+        self.grid = bytearray(self.size)
+        self.body = [0] * self.size
+        self.head_index = 0
+        self.length = 0
+        self.free = list(free)
+        self.free_index = [-1] * self.size
+        for i, cell in enumerate(self.free):
+            self.free_index[cell] = i
+        for cell in body:
+            self.head_index = (self.head_index + 1) % self.size
+            self.body[self.head_index] = cell
+            self.length += 1
+            self.grid[cell] = BODY
+        self.food = food
+        if food >= 0:
+            self.grid[food] = FOOD
+        self.alive = bool(alive)
+        self.won = bool(won)
+        self.rng.setstate((3, tuple(rng_state), None))
+
+    def step(self, direction):  # Moves the snake one cell, returns False once the game is over
+        if not self.alive or self.won:
+            return False
+        if self.length > 1 and direction == OPPOSITE[self.direction]:
+            direction = self.direction  # The snake can't turn back into its own body
+        self.direction = direction
+        self.steps += 1
+        self.steps_since_food += 1
+
+        target = self.next_cell[self.head][direction]
+        if target < 0:
+            self.alive = False
+            return False
+
+        if target == self.food:
+            self.score += 1
+            self.steps_since_food = 0
+            self.push_head(target)
+            self.spawn_food()
+            return not self.won
+
+        self.pop_tail()  # The tail moves away first, so the head may take its cell
+        if self.grid[target] == BODY:
+            self.alive = False
+            return False
+        self.push_head(target)
+        return True
+
+
+class DistanceField:
+    # Distance from every cell to the food, from a single BFS that starts at the food and spreads over the free
+    # cells, so the distance of any head position or candidate move is a lookup instead of a search
+    # dist is a flat int32 array indexed by cell id (any numbering that neighbors uses), -1 where the food can't be
+    # reached. Cells that become part of the body after the build are marked with block() and cells the tail leaves
+    # with free(), which spreads the distance of the freed cell to the cells it brings closer to the food. No
+    # distance is then larger than the shortest path over the free cells, so a path read off the field by always
+    # stepping to a closer cell is a shortest one. path() only builds the field again when the food moved, or when
+    # no path can be read off and the body entered the region around the food since the last build
+    def __init__(self, neighbors):  # neighbors[cell] lists the cells next to cell
+        self.neighbors = neighbors
+        self.unreached = array('i', [-1]) * len(neighbors)
+        self.dist = array('i', self.unreached)
+        self.queue = array('i', [0]) * len(neighbors)
+        self.body = bytearray(len(neighbors))  # 1 on the cells of the body as the field knows them
+        self.food = -1
+        self.stale = False  # The body entered the region around the food since the last build
+        self.builds = 0
+        self.reached = 0  # Cells the last build reached
+
+    def build(self, food, blocked):
+        self.builds += 1
+        dist, queue, neighbors = self.dist, self.queue, self.neighbors
+        dist[:] = self.unreached
+        body = self.body
+        body[:] = bytes(len(body))
+        blocked = list(blocked)
+        for cell in blocked:
+            dist[cell] = -2  # Marks blocked cells during the search
+            body[cell] = 1
+        dist[food] = 0
+        queue[0] = food
+        q_head, q_tail = 0, 1
+        while q_head < q_tail:
+            node = queue[q_head]
+            q_head += 1
+            next_dist = dist[node] + 1
+            for next_node in neighbors[node]:
+                if dist[next_node] == -1:
+                    dist[next_node] = next_dist
+                    queue[q_tail] = next_node
+                    q_tail += 1
+        for cell in blocked:
+            dist[cell] = -1
+        self.food = food
+        self.stale = False
+        self.reached = q_tail
+
+    def block(self, cell):  # The cell became part of the body since the last build
+        if self.dist[cell] >= 0:
+            self.stale = True
+        self.dist[cell] = -1
+        self.body[cell] = 1
+
+    def free(self, cell):  # The tail left the cell since the last build
+        dist, queue, neighbors, body = self.dist, self.queue, self.neighbors, self.body
+        body[cell] = 0
+        cell_dist = -1
+        for next_node in neighbors[cell]:
+            d = dist[next_node]
+            if d >= 0 and (cell_dist < 0 or d + 1 < cell_dist):
+                cell_dist = d + 1
+        if cell_dist < 0:
+            return
+        dist[cell] = cell_dist
+        queue[0] = cell
+        q_head, q_tail = 0, 1
+        while q_head < q_tail:  # BFS from the freed cell over the free cells it brings closer
+            node = queue[q_head]
+            q_head += 1
+            next_dist = dist[node] + 1
+            for next_node in neighbors[node]:
+                d = dist[next_node]
+                if (d < 0 or d > next_dist) and not body[next_node]:
+                    dist[next_node] = next_dist
+                    queue[q_tail] = next_node
+                    q_tail += 1
+
+    def path(self, cell, food, blocked):  # Path from cell to the food, blocked is only read if the field is built
+        if food != self.food:
+            self.build(food, blocked)
+            return self.path_from(cell)
+        path = self.path_from(cell)
+        if not path and self.stale:
+            self.build(food, blocked)
+            path = self.path_from(cell)
+        return path
+
+    def step_from(self, cell, below):  # Neighbor of cell closest to the food with a distance under below, or -1
+        best = -1
+        for next_node in self.neighbors[cell]:
+            d = self.dist[next_node]
+            if 0 <= d < below:
+                best, below = next_node, d
+        return best
+
+    def path_from(self, cell):  # Path from cell to the food read off the field (cell excluded), [] if it is cut
+        dist = self.dist
+        path = []
+        next_node = self.step_from(cell, len(dist))
+        while next_node >= 0:
+            path.append(next_node)
+            if next_node == self.food:
+                return path
+            next_node = self.step_from(next_node, dist[next_node])
+        return []
+
+
+# Plays one game with a policy and returns the game, stops when the snake goes max_steps_without_food steps
+# without eating (many policies can loop forever)
+# on_step(game) is called after every move, including the last one
+def play(game, policy, max_steps_without_food=None, on_step=None):
+    if max_steps_without_food is None:
+        max_steps_without_food = 4 * game.size
+    if hasattr(policy, 'reset'):
+        policy.reset(game)
+    while True:
+        running = game.step(policy.act(game))
+        if on_step:
+            on_step(game)
+        if not running or game.steps_since_food > max_steps_without_food:
+            break
+    return game
@@ -0,0 +1,102 @@
+from random import seed
+
+from benchmark import load_script, new_game
+from snake_core import DistanceField, play
+
+# Apple placement and the free cell index of the breadth first snake
+# Run with: python -m pytest test_breadth_first.py
+
+bf = load_script('breadth first.py')
+
+LAST_FREE = [5, 7]
+
+
+def snake_covering(positions):  # A snake on the given positions, head first, they need not be connected
+    snake = bf.Snake(None)
+    snake.squares = [bf.Square(list(pos), None) for pos in positions]
+    snake.head = snake.squares[0]
+    snake.tail = snake.squares[-1]
+    snake.rebuild_free_cells()
+    return snake
+
+
+def assert_free_cells_match(snake):
+    covered = {bf.cell_id(sqr.pos) for sqr in snake.squares if bf.in_grid(sqr.pos)}
+    free_cells = snake.free_cells
+    assert set(free_cells.cells) == set(range(bf.ROWS * bf.ROWS)) - covered
+    assert len(free_cells.cells) == len(set(free_cells.cells))
+    for i, cell in enumerate(free_cells.cells):
+        assert free_cells.index[cell] == i
+    for cell in covered:
+        assert free_cells.index[cell] == -1
+
+
+def test_apple_lands_on_the_last_free_cell():
+    seed(0)
+    snake = snake_covering(pos for pos in bf.GRID if pos != LAST_FREE)
+    assert len(snake.free_cells) == 1
+    for _ in range(200):
+        snake.generate_apple()
+        assert snake.apple.pos == LAST_FREE
+
+
+def test_no_free_cell_leaves_the_apple():
+    seed(0)
+    snake = snake_covering(pos for pos in bf.GRID if pos != LAST_FREE)
+    snake.generate_apple()
+    apple = snake.apple
+    snake.squares.append(bf.Square(list(LAST_FREE), None))
+    snake.rebuild_free_cells()
+    assert len(snake.free_cells) == 0
+
+    calls = []
+    generate_apple = snake.generate_apple
+
+    def counted():  # Recursion would go through the instance attribute and be counted
+        calls.append(1)
+        return generate_apple()
+    snake.generate_apple = counted
+    snake.generate_apple()
+    assert calls == [1]
+    assert snake.apple is apple
+    assert snake.apple.pos == LAST_FREE
+
+
+def test_free_cells_follow_move_and_add_square():
+    seed(0)
+    snake = bf.Snake(None)
+    snake.hamilton_coverage = 2.0
+    grown = 0
+    for tick in range(500):
+        snake.plan_move()
+        snake.move()
+        assert_free_cells_match(snake)
+        if tick % 5 == 0 and not snake.hitting_self() and not snake.head.hitting_wall():
+            snake.add_square()
+            assert_free_cells_match(snake)
+            grown += 1
+        if snake.hitting_self() or snake.head.hitting_wall():
+            break
+    assert grown > 10
+
+
+def test_distance_field_paths_stay_shortest(monkeypatch):  # Paths read off the kept field are as short as a new BFS finds
+    game, policy = new_game(bf.BFSPolicy, 12, 0)
+    path = DistanceField.path
+    checked = []
+
+    def compared(field, cell, food, blocked):
+        blocked = list(blocked)
+        found = path(field, cell, food, blocked)
+        fresh = DistanceField(field.neighbors)
+        fresh.build(food, [c for c in blocked if c != cell])  # The head is where the path starts
+        assert len(found) == max(fresh.dist[cell], 0)
+        checked.append(1)
+        return found
+    monkeypatch.setattr(DistanceField, 'path', compared)  # play() resets the policy and its field
+    play(game, policy, max_steps_without_food=500)
+    assert len(checked) > 1000
+
+
+def test_hamiltonian_endgame_wins():  # Seed 29 got stuck when an unsafe cycle move handed back to the apple planner
+    assert all(bf.moves_to_win(game) for game in list(range(10)) + [29])
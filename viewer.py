@@ -0,0 +1,179 @@
+import argparse
+import os
+import sys
+import threading
+import time
+from collections import namedtuple
+
+from snake_core import BODY, FOOD
+from benchmark import SOLVERS, load_policy, new_game
+
+# Watches a solver play on the shared game core with simulation and drawing decoupled
+# The simulation thread plans and steps the game on its own schedule and publishes an immutable Snapshot after
+# every tick. The main thread runs the pygame event loop at display rate, draws the latest snapshot and drops the
+# ones published in between, so a slow planner tick no longer freezes the window and a slow frame no longer slows
+# the game
+# Run with: python viewer.py SOLVER [--size ROWS] [--seed N] [--tps N] [--fps N] [--coupled]
+# Measure with: python viewer.py SOLVER --measure SECONDS [--spike-ms MS] [--coupled]
+
+Snapshot = namedtuple('Snapshot', ['tick', 'grid', 'head', 'score', 'over'])  # grid is a bytes copy
+COLORS = {BODY: (0, 0, 255), FOOD: (255, 0, 0)}
+
+
+class Handoff:
+    # Latest snapshot, published by replacing one reference so neither side ever waits for the other
+    def __init__(self):
+        self.latest = None
+
+    def publish(self, snapshot):
+        self.latest = snapshot
+
+    def take(self, last_tick):  # The latest snapshot if it is newer than last_tick, None otherwise
+        snapshot = self.latest
+        if snapshot is not None and snapshot.tick != last_tick:
+            return snapshot
+
+
+def snapshot_of(game):
+    return Snapshot(game.steps, bytes(game.grid), game.head, game.score, not game.alive or game.won)
+
+
+def draw_grid(surface, grid, cols, head, square):
+    import pygame
+    surface.fill((15, 15, 15))
+    for cell, content in enumerate(grid):
+        if content:
+            r, c = divmod(cell, cols)
+            pygame.draw.rect(surface, COLORS[content], (c * square + 1, r * square + 1, square - 2, square - 2))
+    r, c = divmod(head, cols)
+    pygame.draw.rect(surface, (255, 255, 255), (c * square + 1, r * square + 1, square - 2, square - 2))
+
+
+class Simulation(threading.Thread):
+    # Plays the game at ticks_per_second (as fast as possible when 0) and publishes a snapshot after every tick
+    def __init__(self, game, policy, handoff, ticks_per_second):
+        super().__init__(daemon=True)
+        self.game = game
+        self.policy = policy
+        self.handoff = handoff
+        self.interval = 1 / ticks_per_second if ticks_per_second else 0
+        self.stopped = False
+
+    def run(self):
+        game = self.game
+        next_tick = time.perf_counter()
+        while not self.stopped and game.step(self.policy.act(game)):
+            self.handoff.publish(snapshot_of(game))
+            if self.interval:
+                next_tick += self.interval
+                delay = next_tick - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_tick = time.perf_counter()  # Behind schedule, don't try to catch up
+        self.handoff.publish(snapshot_of(game))
+
+
+class SpikyPolicy:
+    # Wraps a policy and burns CPU for spike_ms every `every` ticks, like a slow A* or BFS search
+    def __init__(self, policy, spike_ms, every=20):
+        self.policy = policy
+        self.spike = spike_ms / 1000
+        self.every = every
+        self.ticks = 0
+
+    def reset(self, game):
+        if hasattr(self.policy, 'reset'):
+            self.policy.reset(game)
+
+    def act(self, game):
+        self.ticks += 1
+        if self.spike and self.ticks % self.every == 0:
+            end = time.perf_counter() + self.spike
+            while time.perf_counter() < end:
+                pass
+        return self.policy.act(game)
+
+
+def run(game, policy, ticks_per_second, fps, coupled, seconds=None):
+    # Shows the game until the window is closed (or for `seconds`), returns the gaps between event loop iterations
+    import pygame
+    square = max(4, min(30, 600 // max(game.rows, game.cols)))
+    pygame.init()
+    surface = pygame.display.set_mode((game.cols * square, game.rows * square))
+    pygame.display.set_caption('%s %s' % (type(policy).__name__, 'coupled' if coupled else 'decoupled'))
+    clock = pygame.time.Clock()
+    handoff = Handoff()
+    if hasattr(policy, 'reset'):
+        policy.reset(game)
+
+    simulation = None
+    if not coupled:
+        # Both threads share the GIL, a shorter switch interval hands it to the event loop sooner during a long plan
+        sys.setswitchinterval(0.001)
+        simulation = Simulation(game, policy, handoff, ticks_per_second)
+        simulation.start()
+
+    gaps = []
+    frames = 0
+    tick = None
+    start = last = time.perf_counter()
+    running = True
+    while running:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+        if coupled and game.alive and not game.won:
+            # The old model: plan, step and draw back to back in one loop
+            game.step(policy.act(game))
+            handoff.publish(snapshot_of(game))
+        snapshot = handoff.take(tick)
+        if snapshot is not None:
+            tick = snapshot.tick
+            draw_grid(surface, snapshot.grid, game.cols, snapshot.head, square)
+            pygame.display.update()
+            frames += 1
+        clock.tick(fps)
+        now = time.perf_counter()
+        gaps.append(now - last)
+        last = now
+        if seconds is not None and now - start > seconds:
+            running = False
+
+    if simulation:
+        simulation.stopped = True
+        simulation.join()
+    pygame.quit()
+    return gaps, frames, game.steps, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Watch a solver with simulation and drawing decoupled')
+    parser.add_argument('solver', choices=sorted(SOLVERS))
+    parser.add_argument('--size', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--tps', type=int, default=30, help='simulation ticks per second, 0 for as fast as possible')
+    parser.add_argument('--fps', type=int, default=60, help='display frames per second')
+    parser.add_argument('--coupled', action='store_true', help='plan, step and draw in one loop like the scripts')
+    parser.add_argument('--measure', type=float, metavar='SECONDS', help='run headless and report event loop gaps')
+    parser.add_argument('--spike-ms', type=float, default=0, help='CPU-bound delay added to every 20th plan')
+    args = parser.parse_args()
+
+    if args.measure:
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    game, policy = new_game(load_policy(args.solver), args.size, args.seed)
+    if args.spike_ms:
+        policy = SpikyPolicy(policy, args.spike_ms)
+
+    gaps, frames, ticks, elapsed = run(game, policy, args.tps, args.fps, args.coupled, args.measure)
+    if args.measure:
+        gaps.sort()
+        print('%s %s, %.0f ms spikes: event loop gap p50 %.1f ms, p99 %.1f ms, max %.1f ms; '
+              '%.0f frames/sec, %.0f ticks/sec' % (
+                  args.solver, 'coupled' if args.coupled else 'decoupled', args.spike_ms,
+                  1000 * gaps[len(gaps) // 2], 1000 * gaps[int(len(gaps) * 0.99)], 1000 * gaps[-1],
+                  frames / elapsed, ticks / elapsed))
+
+
+if __name__ == '__main__':
+    main()